@@ -12,6 +12,7 @@ urlpatterns = [
 
     # Dashboards spécialisés
     path('super-admin/', views.super_admin_dashboard, name='super_admin_dashboard'),  # ✅ AJOUTÉ
+    path('super-admin/associations/', views.super_admin_associations, name='super_admin_associations'),
 
     # Profil utilisateur
     path('profile/', views.profile_view, name='profile'),
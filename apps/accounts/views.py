@@ -181,4 +181,39 @@ def super_admin_dashboard(request):
         'title': 'Dashboard Super Admin',
     }
 
-    return render(request, 'accounts/super_admin_dashboard.html', context)
\ No newline at end of file
+    return render(request, 'accounts/super_admin_dashboard.html', context)
+
+
+# Associations par page de la vue d'ensemble super admin
+TAILLE_PAGE_ANALYTIQUE = 50
+
+
+@login_required
+def super_admin_associations(request):
+    """Vue d'ensemble des associations pour les super admins - triée et paginée par la base"""
+    if request.user.role != 'super_admin':
+        messages.error(request, "Accès refusé.")
+        return redirect('accounts:login')
+
+    from django.core.paginator import Paginator
+    from apps.associations.models import Association
+    from apps.associations.utils import analytique_associations, repartition_plans
+
+    plan = request.GET.get('plan', '')
+    if plan not in dict(Association.PLAN_CHOICES):
+        plan = ''
+    associations, tri = analytique_associations(tri=request.GET.get('tri'), plan=plan)
+
+    paginator = Paginator(associations, TAILLE_PAGE_ANALYTIQUE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'associations': page,
+        'repartition_plans': repartition_plans(),
+        'plans': Association.PLAN_CHOICES,
+        'plan': plan,
+        'tri': tri,
+        'title': 'Vue d\'ensemble des associations',
+    }
+
+    return render(request, 'accounts/super_admin_associations.html', context)
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from datetime import date
+from decimal import Decimal
 from apps.associations.models import Association
 from apps.cotisations.models import Cotisation
 from apps.paiements.models import Paiement
@@ -10,6 +12,32 @@ class AssociationSerializer(serializers.ModelSerializer):
         fields = ['id', 'nom', 'adresse', 'plan', 'nombre_logements', 'date_creation']
 
 
+class AnalytiqueAssociationSerializer(serializers.ModelSerializer):
+    """Association annotée par analytique_associations() : aucune requête par ligne"""
+    plan_libelle = serializers.CharField(source='get_plan_display', read_only=True)
+    logements_total = serializers.IntegerField(read_only=True)
+    logements_occupes = serializers.IntegerField(read_only=True)
+    taux_occupation = serializers.FloatField(read_only=True)
+    montant_attendu = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+    montant_collecte = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+    montant_impaye = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+    taux_recouvrement = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Association
+        fields = [
+            'id', 'nom', 'plan', 'plan_libelle', 'actif',
+            'logements_total', 'logements_occupes', 'taux_occupation',
+            'montant_attendu', 'montant_collecte', 'montant_impaye', 'taux_recouvrement',
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['taux_occupation'] = round(data['taux_occupation'], 1)
+        data['taux_recouvrement'] = round(data['taux_recouvrement'], 1)
+        return data
+
+
 class CotisationSerializer(serializers.ModelSerializer):
     logement_numero = serializers.CharField(source='logement.numero', read_only=True)
     resident_nom = serializers.CharField(source='logement.resident.get_full_name', read_only=True)
@@ -25,3 +53,20 @@ class PaiementSerializer(serializers.ModelSerializer):
     class Meta:
         model = Paiement
         fields = ['id', 'montant', 'methode', 'date_paiement', 'reference', 'cotisation_info']
+
+
+class LignePaiementSerializer(serializers.Serializer):
+    cotisation = serializers.IntegerField()
+    montant = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    methode = serializers.ChoiceField(choices=Paiement.METHODE_CHOICES)
+    reference = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+
+
+class PaiementLotSerializer(serializers.Serializer):
+    date_paiement = serializers.DateField(default=date.today)
+    lignes = LignePaiementSerializer(many=True, allow_empty=False)
+
+    def validate_date_paiement(self, value):
+        if value > date.today():
+            raise serializers.ValidationError("La date de paiement ne peut pas être dans le futur.")
+        return value
@@ -8,6 +8,10 @@ router.register(r'cotisations', views.CotisationViewSet)
 router.register(r'paiements', views.PaiementViewSet)
 
 urlpatterns = [
+    # Avant le routeur : 'paiements/<pk>/' capturerait 'lot'
+    path('paiements/lot/', views.PaiementLotView.as_view(), name='paiements_lot'),
+    # Avant le routeur : 'associations/<pk>/' capturerait 'analytique'
+    path('associations/analytique/', views.AnalytiqueAssociationsView.as_view(), name='associations_analytique'),
     path('', include(router.urls)),
     path('stats/', views.StatsView.as_view(), name='stats'),
 ]
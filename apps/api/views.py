@@ -1,8 +1,15 @@
-from rest_framework import viewsets, permissions
+from rest_framework import generics, viewsets, permissions
+from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Sum, Count
+from django.core.exceptions import ValidationError
+from django.db.models import Sum, Count, Q
 from .serializers import AssociationSerializer, Association, PaiementSerializer, CotisationSerializer, Cotisation, Paiement, serializers
+from .serializers import PaiementLotSerializer, AnalytiqueAssociationSerializer
+from .permissions import IsAssociationAdmin, IsSuperAdmin
+from apps.associations.utils import analytique_associations, repartition_plans
+from apps.cotisations.resumes import totaux_resumes
+from apps.paiements.utils import enregistrer_paiements_en_lot
 
 
 class AssociationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -56,19 +63,22 @@ class StatsView(APIView):
         if user.role == 'admin_association':
             association = Association.objects.get(admin_principal=user)
 
+            logements = association.logements.aggregate(
+                total=Count('id'),
+                occupes=Count('id', filter=Q(resident__isnull=False)),
+            )
+            # Résumés financiers matérialisés : quelques lignes par mois, pas de parcours des cotisations
+            totaux = totaux_resumes(association.resumes_financiers.all())
+
             stats = {
-                'total_logements': association.logements.count(),
-                'logements_occupes': association.logements.filter(resident__isnull=False).count(),
-                'total_cotisations': association.logements.aggregate(
-                    total=Count('cotisations')
-                )['total'] or 0,
-                'cotisations_payees': Cotisation.objects.filter(
-                    logement__association=association,
-                    statut='payee'
-                ).count(),
-                'montant_collecte': Paiement.objects.filter(
-                    cotisation__logement__association=association
-                ).aggregate(total=Sum('montant'))['total'] or 0,
+                'total_logements': logements['total'],
+                'logements_occupes': logements['occupes'],
+                'total_cotisations': totaux['nombre_cotisations'],
+                'cotisations_payees': totaux['nombre_payees'],
+                'cotisations_retard': totaux['nombre_retard'],
+                'montant_attendu': totaux['total_attendu'],
+                'montant_collecte': totaux['total_collecte'],
+                'taux_recouvrement': totaux['taux_recouvrement'],
             }
 
         elif user.role == 'resident':
@@ -88,3 +98,76 @@ class StatsView(APIView):
             stats = {'error': 'Accès non autorisé'}
 
         return Response(stats)
+
+
+class PaiementLotView(APIView):
+    """API d'enregistrement de paiements en lot (mode caisse)"""
+    permission_classes = [IsAssociationAdmin]
+
+    def post(self, request):
+        if request.user.role != 'admin_association':
+            return Response({'error': 'Accès non autorisé'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            association = Association.objects.get(admin_principal=request.user)
+        except Association.DoesNotExist:
+            return Response({'error': 'Association non trouvée'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = PaiementLotSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        lignes = [
+            {
+                'cotisation_id': ligne['cotisation'],
+                'montant': ligne['montant'],
+                'methode': ligne['methode'],
+                'reference': ligne['reference'],
+            }
+            for ligne in serializer.validated_data['lignes']
+        ]
+
+        try:
+            paiements = enregistrer_paiements_en_lot(
+                association,
+                lignes,
+                enregistre_par=request.user,
+                date_paiement=serializer.validated_data['date_paiement'],
+            )
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'total': len(paiements),
+            'paiements': [
+                {
+                    'cotisation': paiement.cotisation_id,
+                    'montant': paiement.montant,
+                    'numero_recu': paiement.numero_recu,
+                }
+                for paiement in paiements
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+
+class AnalytiqueAssociationsView(generics.ListAPIView):
+    """
+    Vue d'ensemble des associations (super admin) : une requête annotée, paginée par la base
+    Paramètres : ?tri= (voir TRIS_ANALYTIQUE, préfixe '-' décroissant), ?plan=, ?page=
+    """
+    serializer_class = AnalytiqueAssociationSerializer
+    permission_classes = [IsSuperAdmin]
+
+    def get_queryset(self):
+        plan = self.request.query_params.get('plan')
+        if plan not in dict(Association.PLAN_CHOICES):
+            plan = None
+        associations, self.tri = analytique_associations(
+            tri=self.request.query_params.get('tri'), plan=plan
+        )
+        return associations
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['tri'] = self.tri
+        response.data['repartition_plans'] = repartition_plans()
+        return response
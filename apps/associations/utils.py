@@ -0,0 +1,176 @@
+"""
+Utilitaires du tableau de bord association
+- Indicateurs mensuels (attendu, payé, recouvrement) et leur évolution d'un mois
+  à l'autre, lus dans les résumés financiers matérialisés, groupés par mois
+- Vue d'ensemble super admin : occupation, recouvrement et impayés de toutes les
+  associations en une requête annotée, triée et paginée par la base
+"""
+
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import (
+    Case, Count, DecimalField, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, TruncMonth
+
+from apps.cotisations.models import ResumeFinancier
+from .models import Association, Logement
+
+# Nombre de mois affichés dans l'évolution, mois en cours compris
+NOMBRE_MOIS_TENDANCES = 6
+
+# Tris autorisés de la vue d'ensemble (paramètre ?tri=, préfixe '-' pour l'ordre décroissant)
+TRIS_ANALYTIQUE = {
+    'nom': 'nom',
+    'plan': 'plan',
+    'logements': 'logements_total',
+    'occupation': 'taux_occupation',
+    'recouvrement': 'taux_recouvrement',
+    'attendu': 'montant_attendu',
+    'collecte': 'montant_collecte',
+    'impaye': 'montant_impaye',
+}
+
+# Tri par défaut : les associations les plus endettées d'abord
+TRI_ANALYTIQUE_DEFAUT = '-impaye'
+
+
+def _taux(partie, total):
+    return round((partie / total * 100), 1) if total > 0 else 0
+
+
+def indicateurs_mensuels(association, mois_actuel, nombre_mois=NOMBRE_MOIS_TENDANCES):
+    """
+    Indicateurs des nombre_mois derniers mois (le plus ancien d'abord), mois sans cotisation à zéro
+    Une seule requête : résumés financiers (un par type de cotisation) groupés par mois
+    Chaque mois: {mois, total_attendu, total_paye, cotisations, impayees, taux_recouvrement,
+    variation_paye, variation_taux} ; variations par rapport au mois précédent (None pour le premier)
+    """
+    debut_periode = mois_actuel - relativedelta(months=nombre_mois - 1)
+
+    lignes = ResumeFinancier.objects.filter(
+        association=association,
+        periode__range=(debut_periode, mois_actuel + relativedelta(day=31)),
+    ).annotate(
+        mois=TruncMonth('periode')
+    ).values('mois').annotate(
+        total_attendu=Sum('total_attendu'),
+        total_paye=Sum('total_paye'),
+        cotisations=Sum('nombre_cotisations'),
+        impayees=Sum('nombre_impayees'),
+    ).order_by()
+    par_mois = {ligne['mois']: ligne for ligne in lignes}
+
+    indicateurs = []
+    precedent = None
+    for decalage in range(nombre_mois):
+        mois = debut_periode + relativedelta(months=decalage)
+        ligne = par_mois.get(mois, {})
+        total_attendu = ligne.get('total_attendu') or Decimal('0')
+        total_paye = ligne.get('total_paye') or Decimal('0')
+        taux = _taux(total_paye, total_attendu)
+
+        indicateurs.append({
+            'mois': mois,
+            'total_attendu': total_attendu,
+            'total_paye': total_paye,
+            'cotisations': ligne.get('cotisations', 0),
+            'impayees': ligne.get('impayees', 0),
+            'taux_recouvrement': taux,
+            'variation_paye': total_paye - precedent['total_paye'] if precedent else None,
+            'variation_taux': round(taux - precedent['taux_recouvrement'], 1) if precedent else None,
+        })
+        precedent = indicateurs[-1]
+
+    return indicateurs
+
+
+def _agregat_par_association(lignes, agregat, output_field):
+    """
+    Agrégat des lignes liées à l'association courante (sous-requête corrélée, 0 si aucune)
+    Sous-requêtes plutôt que jointures : ni multiplication des lignes (logements x résumés)
+    ni GROUP BY sur toute la table des associations, chaque sous-requête lit l'index association
+    """
+    valeurs = lignes.filter(
+        association=OuterRef('pk')
+    ).order_by().values('association').annotate(total=agregat).values('total')
+    return Coalesce(Subquery(valeurs, output_field=output_field), Value(0), output_field=output_field)
+
+
+def _compte_logements(**filtres):
+    return _agregat_par_association(Logement.objects.filter(**filtres), Count('id'), IntegerField())
+
+
+def _somme_resumes(champ):
+    return _agregat_par_association(
+        ResumeFinancier.objects.all(), Sum(champ), DecimalField(max_digits=16, decimal_places=2)
+    )
+
+
+def _pourcentage(partie, total):
+    """Pourcentage calculé par la base, 0 si le total est nul"""
+    return Case(
+        When(**{f'{total}__gt': 0}, then=Cast(F(partie), FloatField()) * 100.0 / Cast(F(total), FloatField())),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def champ_tri_analytique(tri):
+    """Paramètre ?tri= -> (clé retenue, champ order_by) ; tri inconnu remplacé par le tri par défaut"""
+    cle = (tri or '').lstrip('-')
+    if cle not in TRIS_ANALYTIQUE:
+        tri = TRI_ANALYTIQUE_DEFAUT
+        cle = tri.lstrip('-')
+    prefixe = '-' if tri.startswith('-') else ''
+    return tri, f'{prefixe}{TRIS_ANALYTIQUE[cle]}'
+
+
+def analytique_associations(tri=None, plan=None):
+    """
+    Toutes les associations annotées en une requête : logements comptés et montants attendus,
+    collectés et impayés sommés (résumés financiers) par des sous-requêtes groupées, taux
+    d'occupation et de recouvrement calculés par la base pour pouvoir trier dessus
+    Retourne (queryset trié, clé de tri retenue) ; le queryset est paginé par l'appelant
+    """
+    tri, ordre = champ_tri_analytique(tri)
+
+    associations = Association.objects.all()
+    if plan:
+        associations = associations.filter(plan=plan)
+
+    associations = associations.annotate(
+        logements_total=_compte_logements(),
+        logements_occupes=_compte_logements(resident__isnull=False),
+        montant_attendu=_somme_resumes('total_attendu'),
+        montant_collecte=_somme_resumes('total_collecte'),
+        montant_impaye=_somme_resumes('total_impaye'),
+    ).annotate(
+        taux_occupation=_pourcentage('logements_occupes', 'logements_total'),
+        taux_recouvrement=_pourcentage('montant_collecte', 'montant_attendu'),
+    ).order_by(ordre, 'pk')  # pk : ordre stable d'une page à l'autre
+
+    return associations, tri
+
+
+def repartition_plans():
+    """Nombre d'associations et de logements déclarés par plan, une requête groupée"""
+    comptes = {
+        ligne['plan']: ligne
+        for ligne in Association.objects.values('plan').annotate(
+            associations=Count('id'),
+            actives=Count('id', filter=Q(actif=True)),
+            logements=Sum('nombre_logements'),
+        ).order_by()
+    }
+    return [
+        {
+            'plan': plan,
+            'libelle': libelle,
+            'associations': comptes.get(plan, {}).get('associations', 0),
+            'actives': comptes.get(plan, {}).get('actives', 0),
+            'logements': comptes.get(plan, {}).get('logements') or 0,
+        }
+        for plan, libelle in Association.PLAN_CHOICES
+    ]
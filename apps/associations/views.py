@@ -1,7 +1,12 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Q
+from datetime import date
+
 from .models import Association, Logement
+from .utils import indicateurs_mensuels
+from apps.cotisations.models import Cotisation
 
 
 @login_required
@@ -9,34 +14,41 @@ def tableau_bord_association(request):
     """Tableau de bord admin association - Simple et efficace"""
     if request.user.role != 'admin_association':
         messages.error(request, "Accès non autorisé")
-        return redirect('login')
+        return redirect('accounts:login')
 
     association = get_object_or_404(Association, admin_principal=request.user)
 
-    # Statistiques simples
-    total_logements = association.logements.count()
-    logements_occupes = association.logements.filter(resident__isnull=False).count()
+    # Logements : total et occupés en une agrégation
+    logements = association.logements.aggregate(
+        total=Count('id'),
+        occupes=Count('id', filter=Q(resident__isnull=False)),
+    )
+    total_logements = logements['total']
+    logements_occupes = logements['occupes']
 
-    # Cotisations du mois en cours
-    from datetime import date
+    # Indicateurs des derniers mois en une requête groupée, le mois en cours en dernier
     mois_actuel = date.today().replace(day=1)
-    cotisations_mois = Cotisation.objects.filter(
-        logement__association=association,
-        periode=mois_actuel
-    )
+    tendances = indicateurs_mensuels(association, mois_actuel)
+    mois_courant = tendances[-1]
 
-    total_attendu = sum(c.montant for c in cotisations_mois)
-    total_paye = sum(c.montant for c in cotisations_mois if c.statut == 'payee')
+    cotisations_impayees = Cotisation.objects.filter(
+        logement__association=association,
+        periode=mois_actuel,
+        statut__in=['due', 'retard'],
+    ).select_related('logement__resident').order_by('logement__numero')
 
     context = {
         'association': association,
         'total_logements': total_logements,
         'logements_occupes': logements_occupes,
         'taux_occupation': round((logements_occupes / total_logements * 100), 1) if total_logements > 0 else 0,
-        'total_attendu': total_attendu,
-        'total_paye': total_paye,
-        'taux_recouvrement': round((total_paye / total_attendu * 100), 1) if total_attendu > 0 else 0,
-        'cotisations_impayees': cotisations_mois.filter(statut__in=['due', 'retard']),
+        'total_attendu': mois_courant['total_attendu'],
+        'total_paye': mois_courant['total_paye'],
+        'taux_recouvrement': mois_courant['taux_recouvrement'],
+        'variation_paye': mois_courant['variation_paye'],
+        'variation_taux': mois_courant['variation_taux'],
+        'tendances': tendances,
+        'cotisations_impayees': cotisations_impayees,
     }
 
     return render(request, 'associations/tableau_bord.html', context)
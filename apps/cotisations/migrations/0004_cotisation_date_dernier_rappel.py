@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotisations', '0003_alter_cotisation_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotisation',
+            name='date_dernier_rappel',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Date du dernier rappel'),
+        ),
+    ]
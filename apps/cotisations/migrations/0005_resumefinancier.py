@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:22
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+import django.utils.timezone
+
+# Associations agrégées par requête pendant le remplissage initial
+TAILLE_LOT_REMPLISSAGE = 200
+
+
+def remplir_resumes(apps, schema_editor):
+    """
+    Remplir les résumés à partir des cotisations existantes, par lots d'associations
+    (modèles historiques : même calcul que resumes._agregats_resume à cet état du schéma)
+    """
+    Association = apps.get_model('associations', 'Association')
+    Cotisation = apps.get_model('cotisations', 'Cotisation')
+    ResumeFinancier = apps.get_model('cotisations', 'ResumeFinancier')
+
+    association_ids = list(Association.objects.order_by('pk').values_list('pk', flat=True))
+    for debut in range(0, len(association_ids), TAILLE_LOT_REMPLISSAGE):
+        lignes = Cotisation.objects.filter(
+            logement__association_id__in=association_ids[debut:debut + TAILLE_LOT_REMPLISSAGE]
+        ).values('logement__association_id', 'periode', 'type_cotisation_id').annotate(
+            nombre_cotisations=Count('id'),
+            nombre_payees=Count('id', filter=Q(statut='payee')),
+            nombre_impayees=Count('id', filter=Q(statut__in=['due', 'retard'])),
+            nombre_retard=Count('id', filter=Q(statut='retard')),
+            nombre_paiements=Count('paiement'),
+            total_attendu=Sum('montant'),
+            total_paye=Sum('montant', filter=Q(statut='payee')),
+            total_collecte=Sum('paiement__montant'),
+        ).order_by()
+
+        ResumeFinancier.objects.bulk_create([
+            ResumeFinancier(
+                association_id=ligne['logement__association_id'],
+                periode=ligne['periode'],
+                type_cotisation_id=ligne['type_cotisation_id'],
+                nombre_cotisations=ligne['nombre_cotisations'],
+                nombre_payees=ligne['nombre_payees'],
+                nombre_impayees=ligne['nombre_impayees'],
+                nombre_retard=ligne['nombre_retard'],
+                nombre_paiements=ligne['nombre_paiements'],
+                total_attendu=ligne['total_attendu'] or 0,
+                total_paye=ligne['total_paye'] or 0,
+                total_collecte=ligne['total_collecte'] or 0,
+            )
+            for ligne in lignes
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('associations', '0003_remove_logement_unique_logement_association_and_more'),
+        ('cotisations', '0004_cotisation_date_dernier_rappel'),
+        ('paiements', '0004_compteurrecu'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeFinancier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.DateField(verbose_name='Période')),
+                ('nombre_cotisations', models.PositiveIntegerField(default=0, verbose_name='Cotisations')),
+                ('nombre_payees', models.PositiveIntegerField(default=0, verbose_name='Cotisations payées')),
+                ('nombre_impayees', models.PositiveIntegerField(default=0, verbose_name='Cotisations impayées')),
+                ('nombre_retard', models.PositiveIntegerField(default=0, verbose_name='Cotisations en retard')),
+                ('nombre_paiements', models.PositiveIntegerField(default=0, verbose_name='Paiements')),
+                ('total_attendu', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total attendu')),
+                ('total_paye', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Montant des cotisations payées')),
+                ('total_collecte', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des paiements')),
+                ('date_mise_a_jour', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Mis à jour le')),
+                ('association', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumes_financiers', to='associations.association', verbose_name='Association')),
+                ('type_cotisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumes_financiers', to='cotisations.typecotisation', verbose_name='Type de cotisation')),
+            ],
+            options={
+                'verbose_name': 'Résumé financier',
+                'verbose_name_plural': 'Résumés financiers',
+                'db_table': 'iltizem_resumes_financiers',
+                'ordering': ['association', '-periode'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumefinancier',
+            constraint=models.UniqueConstraint(fields=('association', 'periode', 'type_cotisation'), name='unique_resume_financier'),
+        ),
+        migrations.RunPython(remplir_resumes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:24
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+# Associations traitées par requête pendant le remplissage de total_impaye
+TAILLE_LOT_REMPLISSAGE = 200
+
+
+def remplir_total_impaye(apps, schema_editor):
+    """Montant des cotisations dues ou en retard de chaque résumé existant, par lots d'associations"""
+    Association = apps.get_model('associations', 'Association')
+    Cotisation = apps.get_model('cotisations', 'Cotisation')
+    ResumeFinancier = apps.get_model('cotisations', 'ResumeFinancier')
+
+    association_ids = list(Association.objects.order_by('pk').values_list('pk', flat=True))
+    for debut in range(0, len(association_ids), TAILLE_LOT_REMPLISSAGE):
+        lot = association_ids[debut:debut + TAILLE_LOT_REMPLISSAGE]
+        impayes = {
+            (ligne['logement__association_id'], ligne['periode'], ligne['type_cotisation_id']): ligne['total']
+            for ligne in Cotisation.objects.filter(logement__association_id__in=lot).values(
+                'logement__association_id', 'periode', 'type_cotisation_id'
+            ).annotate(
+                total=Sum('montant', filter=Q(statut__in=['due', 'retard']))
+            ).order_by()
+        }
+
+        resumes = list(ResumeFinancier.objects.filter(association_id__in=lot))
+        for resume in resumes:
+            resume.total_impaye = impayes.get(
+                (resume.association_id, resume.periode, resume.type_cotisation_id)
+            ) or 0
+        ResumeFinancier.objects.bulk_update(resumes, ['total_impaye'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotisations', '0005_resumefinancier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumefinancier',
+            name='total_impaye',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Montant des cotisations impayées'),
+        ),
+        migrations.RunPython(remplir_total_impaye, migrations.RunPython.noop),
+    ]
@@ -162,6 +162,14 @@ class Cotisation(models.Model):
         verbose_name='Description/Note'
     )
 
+    # Rappel de retard (un seul rappel automatique par cotisation)
+    date_dernier_rappel = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Date du dernier rappel'
+    )
+
     # Métadonnées
     date_creation = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Date de création')
     date_modification = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Dernière modification')
@@ -219,6 +227,11 @@ class Cotisation(models.Model):
         elif self.statut == 'retard' and self.date_echeance >= date.today():
             self.statut = 'due'
 
+        # save() est aussi appelé avec update_fields : la date suit toute modification
+        self.date_modification = timezone.now()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'date_modification'}
+
         super().save(*args, **kwargs)
 
     def get_context_notification(self):
@@ -241,4 +254,66 @@ class Cotisation(models.Model):
             'association': association.nom,
             'type_cotisation': self.type_cotisation.nom,
             'statut': self.get_statut_display(),
-        }
\ No newline at end of file
+        }
+
+
+class ResumeFinancier(models.Model):
+    """
+    Résumé financier matérialisé par (association, période, type de cotisation)
+    Tenu à jour à chaque écriture de cotisation ou de paiement (voir resumes.py),
+    reconstruit chaque nuit ; les tableaux de bord et l'API lisent ces lignes
+    au lieu de parcourir les cotisations
+    """
+
+    association = models.ForeignKey(
+        Association,
+        on_delete=models.CASCADE,
+        related_name='resumes_financiers',
+        verbose_name='Association'
+    )
+    periode = models.DateField(verbose_name='Période')
+    type_cotisation = models.ForeignKey(
+        TypeCotisation,
+        on_delete=models.CASCADE,
+        related_name='resumes_financiers',
+        verbose_name='Type de cotisation'
+    )
+
+    # Compteurs
+    nombre_cotisations = models.PositiveIntegerField(default=0, verbose_name='Cotisations')
+    nombre_payees = models.PositiveIntegerField(default=0, verbose_name='Cotisations payées')
+    nombre_impayees = models.PositiveIntegerField(default=0, verbose_name='Cotisations impayées')
+    nombre_retard = models.PositiveIntegerField(default=0, verbose_name='Cotisations en retard')
+    nombre_paiements = models.PositiveIntegerField(default=0, verbose_name='Paiements')
+
+    # Montants (DA)
+    total_attendu = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Total attendu')
+    total_paye = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                     verbose_name='Montant des cotisations payées')
+    total_impaye = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                       verbose_name='Montant des cotisations impayées')
+    total_collecte = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                         verbose_name='Total des paiements')
+
+    date_mise_a_jour = models.DateTimeField(default=timezone.now, verbose_name='Mis à jour le')
+
+    class Meta:
+        verbose_name = 'Résumé financier'
+        verbose_name_plural = 'Résumés financiers'
+        db_table = 'iltizem_resumes_financiers'
+        ordering = ['association', '-periode']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['association', 'periode', 'type_cotisation'],
+                name='unique_resume_financier'
+            )
+        ]
+
+    def __str__(self):
+        return f"Résumé {self.association_id} - {self.periode.strftime('%m/%Y')} - type {self.type_cotisation_id}"
+
+    def get_taux_recouvrement(self):
+        """Pourcentage du montant attendu effectivement encaissé"""
+        if self.total_attendu > 0:
+            return round(float(self.total_collecte / self.total_attendu * 100), 1)
+        return 0
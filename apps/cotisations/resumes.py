@@ -0,0 +1,203 @@
+"""
+Résumés financiers matérialisés (ResumeFinancier)
+- Recalcul ciblé des clés (association, période, type) touchées par une écriture,
+  après le commit, en une requête groupée
+- Reconstruction complète périodique, par lots d'associations
+- Lectures agrégées pour les tableaux de bord et l'API
+- Signal cotisations_modifiees envoyé après le commit de chaque écriture, unitaire
+  ou en masse, pour les autres données dérivées (instantanés des rapports)
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.associations.models import Logement
+from .models import Cotisation, ResumeFinancier
+
+# Envoyé après le commit d'une écriture de cotisations ou de paiements
+# cles: ensemble de (association_id, periode, type_cotisation_id) touchés
+cotisations_modifiees = Signal()
+
+# Nombre d'associations reconstruites par requête
+TAILLE_LOT_RECONSTRUCTION = 200
+
+# Compteurs et montants du résumé, dans l'ordre des champs du modèle
+CHAMPS_RESUME = [
+    'nombre_cotisations',
+    'nombre_payees',
+    'nombre_impayees',
+    'nombre_retard',
+    'nombre_paiements',
+    'total_attendu',
+    'total_paye',
+    'total_impaye',
+    'total_collecte',
+]
+
+
+def _agregats_resume():
+    """Agrégats d'un groupe de cotisations, un par champ de CHAMPS_RESUME"""
+    return {
+        'nombre_cotisations': Count('id'),
+        'nombre_payees': Count('id', filter=Q(statut='payee')),
+        'nombre_impayees': Count('id', filter=Q(statut__in=['due', 'retard'])),
+        'nombre_retard': Count('id', filter=Q(statut='retard')),
+        'nombre_paiements': Count('paiement'),
+        'total_attendu': Sum('montant'),
+        'total_paye': Sum('montant', filter=Q(statut='payee')),
+        'total_impaye': Sum('montant', filter=Q(statut__in=['due', 'retard'])),
+        'total_collecte': Sum('paiement__montant'),
+    }
+
+
+def _calculer_resumes(cotisations):
+    """Cotisations groupées par clé -> {(association_id, periode, type_cotisation_id): valeurs}"""
+    lignes = cotisations.values(
+        'logement__association_id', 'periode', 'type_cotisation_id'
+    ).annotate(**_agregats_resume()).order_by()
+
+    return {
+        (ligne['logement__association_id'], ligne['periode'], ligne['type_cotisation_id']): {
+            champ: ligne[champ] or 0 for champ in CHAMPS_RESUME
+        }
+        for ligne in lignes
+    }
+
+
+def _enregistrer_resumes(calcules, existants):
+    """
+    Écrire les résumés calculés : mise à jour des lignes existantes, création des
+    nouvelles, suppression des clés qui n'ont plus de cotisation
+    existants: {clé: ResumeFinancier} des clés concernées
+    """
+    maintenant = timezone.now()
+    nouveaux = []
+    modifies = []
+    for (association_id, periode, type_cotisation_id), valeurs in calcules.items():
+        resume = existants.get((association_id, periode, type_cotisation_id)) or ResumeFinancier(
+            association_id=association_id,
+            periode=periode,
+            type_cotisation_id=type_cotisation_id,
+        )
+        for champ, valeur in valeurs.items():
+            setattr(resume, champ, valeur)
+        resume.date_mise_a_jour = maintenant
+        (modifies if resume.pk else nouveaux).append(resume)
+
+    if nouveaux:
+        # Clé créée en parallèle par une autre écriture : le prochain recalcul la corrige
+        ResumeFinancier.objects.bulk_create(nouveaux, ignore_conflicts=True)
+    if modifies:
+        ResumeFinancier.objects.bulk_update(modifies, CHAMPS_RESUME + ['date_mise_a_jour'])
+
+    vides = [resume.pk for cle, resume in existants.items() if cle not in calcules]
+    if vides:
+        ResumeFinancier.objects.filter(pk__in=vides).delete()
+
+
+def recalculer_resumes(cles):
+    """
+    Recalculer les résumés des clés (association_id, periode, type_cotisation_id)
+    Une requête groupée sur les cotisations concernées, une lecture des résumés existants
+    """
+    cles = set(cles)
+    if not cles:
+        return 0
+
+    association_ids = {cle[0] for cle in cles}
+    periodes = {cle[1] for cle in cles}
+    type_ids = {cle[2] for cle in cles}
+
+    # Produit des trois filtres : sur-ensemble des clés, réduit ensuite en Python
+    calcules = _calculer_resumes(Cotisation.objects.filter(
+        logement__association_id__in=association_ids,
+        periode__in=periodes,
+        type_cotisation_id__in=type_ids,
+    ))
+    calcules = {cle: valeurs for cle, valeurs in calcules.items() if cle in cles}
+
+    existants = {}
+    for resume in ResumeFinancier.objects.filter(
+        association_id__in=association_ids,
+        periode__in=periodes,
+        type_cotisation_id__in=type_ids,
+    ):
+        cle = (resume.association_id, resume.periode, resume.type_cotisation_id)
+        if cle in cles:
+            existants[cle] = resume
+
+    _enregistrer_resumes(calcules, existants)
+    return len(cles)
+
+
+def cle_resume(cotisation):
+    """Clé (association_id, periode, type_cotisation_id) du résumé d'une cotisation"""
+    if Cotisation.logement.is_cached(cotisation):
+        association_id = cotisation.logement.association_id
+    else:
+        association_id = Logement.objects.filter(pk=cotisation.logement_id).values_list(
+            'association_id', flat=True
+        ).first()
+    return association_id, cotisation.periode, cotisation.type_cotisation_id
+
+
+def _apres_ecriture(cles):
+    cotisations_modifiees.send(sender=Cotisation, cles=cles)
+    recalculer_resumes(cles)
+
+
+def programmer_recalcul_resumes(cles):
+    """
+    Après le commit de la transaction en cours : prévenir les abonnés de
+    cotisations_modifiees puis recalculer les résumés des clés données
+    """
+    cles = set(cles)
+    if cles:
+        transaction.on_commit(lambda: _apres_ecriture(cles))
+
+
+def programmer_recalcul_resumes_cotisations(cotisation_ids):
+    """
+    Écritures en masse (update(), bulk_create()) : retrouver les clés des cotisations
+    en une requête puis programmer leur recalcul
+    """
+    cotisation_ids = list(cotisation_ids)
+    if not cotisation_ids:
+        return
+    programmer_recalcul_resumes(
+        Cotisation.objects.filter(pk__in=cotisation_ids).values_list(
+            'logement__association_id', 'periode', 'type_cotisation_id'
+        ).distinct()
+    )
+
+
+def reconstruire_resumes(association_ids):
+    """
+    Reconstruire tous les résumés des associations données
+    Retourne le nombre de résumés écrits
+    """
+    calcules = _calculer_resumes(Cotisation.objects.filter(logement__association_id__in=association_ids))
+    existants = {
+        (resume.association_id, resume.periode, resume.type_cotisation_id): resume
+        for resume in ResumeFinancier.objects.filter(association_id__in=association_ids)
+    }
+    _enregistrer_resumes(calcules, existants)
+    return len(calcules)
+
+
+def totaux_resumes(resumes):
+    """
+    Totaux d'un queryset de ResumeFinancier en une agrégation
+    Retourne les champs de CHAMPS_RESUME (0 si aucune ligne) et taux_recouvrement
+    """
+    totaux = resumes.aggregate(**{champ: Sum(champ) for champ in CHAMPS_RESUME})
+    totaux = {champ: valeur or 0 for champ, valeur in totaux.items()}
+    total_attendu = totaux['total_attendu'] or Decimal('0')
+    totaux['taux_recouvrement'] = (
+        round(float(totaux['total_collecte'] / total_attendu * 100), 1) if total_attendu > 0 else 0
+    )
+    return totaux
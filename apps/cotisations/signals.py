@@ -0,0 +1,19 @@
+"""
+Signaux des cotisations
+- Recalcul du résumé financier (ResumeFinancier) de la cotisation modifiée
+  (les écritures en masse programment le recalcul elles-mêmes)
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Cotisation
+from .resumes import cle_resume, programmer_recalcul_resumes
+
+
+@receiver(post_save, sender=Cotisation)
+@receiver(post_delete, sender=Cotisation)
+def recalculer_resume_cotisation(sender, instance, **kwargs):
+    association_id, periode, type_cotisation_id = cle_resume(instance)
+    if association_id is not None:
+        programmer_recalcul_resumes([(association_id, periode, type_cotisation_id)])
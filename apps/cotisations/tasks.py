@@ -0,0 +1,137 @@
+"""
+Tâches Celery des cotisations
+- Génération périodique des cotisations, répartie sur les workers
+- Mise à jour nocturne des statuts de retard
+- Reconstruction nocturne des résumés financiers
+"""
+
+import logging
+from celery import shared_task, chord
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.db import DatabaseError
+from django.db.models import Prefetch
+
+from apps.associations.models import Association
+from .models import TypeCotisation
+from .resumes import TAILLE_LOT_RECONSTRUCTION, reconstruire_resumes
+from .utils import generer_cotisations_en_masse, mettre_a_jour_statuts
+
+logger = logging.getLogger('iltizem')
+
+# Nombre d'associations traitées par sous-tâche
+TAILLE_SHARD_ASSOCIATIONS = 20
+
+
+@shared_task
+def generer_cotisations_automatiques():
+    """
+    Générer automatiquement les cotisations mensuelles
+    Répartit les associations actives en lots traités en parallèle (chord),
+    puis agrège les compteurs dans une tâche de synthèse
+    """
+    # Premier jour du mois prochain, figé ici pour que les relances visent la même période
+    prochaine_periode = (date.today() + relativedelta(months=1)).replace(day=1)
+
+    association_ids = list(
+        Association.objects.filter(actif=True).order_by('id').values_list('id', flat=True)
+    )
+    shards = [
+        association_ids[i:i + TAILLE_SHARD_ASSOCIATIONS]
+        for i in range(0, len(association_ids), TAILLE_SHARD_ASSOCIATIONS)
+    ]
+
+    if not shards:
+        return "Cotisations générées: 0"
+
+    chord(
+        generer_cotisations_shard.s(shard, prochaine_periode.isoformat())
+        for shard in shards
+    )(resumer_generation_cotisations.s(prochaine_periode.isoformat()))
+
+    return f"Génération lancée: {len(association_ids)} associations en {len(shards)} lots"
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+    acks_late=True,
+)
+def generer_cotisations_shard(self, association_ids, periode_iso):
+    """
+    Générer les cotisations mensuelles d'un lot d'associations
+    Idempotente : une relance ne recrée que les cotisations encore manquantes
+    Retourne {association_id: nombre de cotisations créées}
+    """
+    prochaine_periode = date.fromisoformat(periode_iso)
+    # Échéance au 10 du mois de la période
+    echeance = prochaine_periode + relativedelta(day=10)
+
+    associations = Association.objects.filter(id__in=association_ids, actif=True).prefetch_related(
+        Prefetch(
+            'types_cotisations',
+            queryset=TypeCotisation.objects.filter(actif=True, periodicite='mensuelle'),
+            to_attr='types_mensuels'
+        )
+    )
+
+    resultats = generer_cotisations_en_masse(
+        associations,
+        lambda association: [
+            (type_cotisation, prochaine_periode, echeance)
+            for type_cotisation in association.types_mensuels
+        ]
+    )
+
+    # Clés en texte pour la sérialisation JSON des résultats
+    return {str(association_id): count for association_id, count in resultats.items()}
+
+
+@shared_task
+def resumer_generation_cotisations(resultats_shards, periode_iso):
+    """Agréger les compteurs renvoyés par les lots de génération"""
+    par_association = {}
+    for resultat in resultats_shards:
+        par_association.update(resultat or {})
+
+    total_created = sum(par_association.values())
+    logger.info(
+        "Génération des cotisations %s: %s créées pour %s associations",
+        periode_iso, total_created, len(par_association)
+    )
+
+    return f"Cotisations générées: {total_created}"
+
+
+@shared_task
+def mettre_a_jour_statuts_retard():
+    """
+    Mettre à jour les statuts de retard de toutes les cotisations
+    Balayage par UPDATE en masse : les tableaux de bord lisent des statuts à jour
+    sans attendre un Cotisation.save()
+    """
+    en_retard, retablies = mettre_a_jour_statuts()
+
+    logger.info("Statuts de retard: %s passées en retard, %s rétablies en due", en_retard, retablies)
+
+    return f"Statuts mis à jour: {en_retard} en retard, {retablies} rétablies"
+
+
+@shared_task
+def reconstruire_resumes_financiers():
+    """
+    Reconstruire tous les résumés financiers, par lots d'associations
+    Filet de sécurité du recalcul à chaque écriture (clé d'une cotisation déplacée,
+    écriture concurrente, modification hors application)
+    """
+    association_ids = list(Association.objects.order_by('id').values_list('id', flat=True))
+
+    total = 0
+    for i in range(0, len(association_ids), TAILLE_LOT_RECONSTRUCTION):
+        total += reconstruire_resumes(association_ids[i:i + TAILLE_LOT_RECONSTRUCTION])
+
+    logger.info("Résumés financiers reconstruits: %s pour %s associations", total, len(association_ids))
+
+    return f"Résumés financiers reconstruits: {total}"
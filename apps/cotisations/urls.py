@@ -5,5 +5,6 @@ app_name = 'cotisations'
 
 urlpatterns = [
     path('', views.liste_cotisations, name='liste'),
+    path('export/csv/', views.exporter_cotisations_csv, name='export_csv'),
     path('generer/', views.generer_cotisations, name='generer'),
 ]
@@ -0,0 +1,156 @@
+"""
+Utilitaires pour la génération des cotisations
+Moteur de génération en masse partagé par la tâche Celery,
+la commande de gestion et la vue de génération
+"""
+
+from datetime import date
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.residents.utils import invalider_tableaux_bord_residents
+from .models import Cotisation
+from .resumes import programmer_recalcul_resumes, programmer_recalcul_resumes_cotisations
+
+# Nombre de cotisations insérées par requête INSERT
+TAILLE_LOT_COTISATIONS = 500
+
+# Nombre de cotisations modifiées par requête UPDATE lors du balayage des statuts
+TAILLE_LOT_STATUTS = 2000
+
+
+def _cotisations_manquantes(association, cibles):
+    """
+    Calculer les cotisations manquantes d'une association en une seule requête
+    cibles: liste de (type_cotisation, periode, date_echeance)
+
+    Chaque logement est annoté d'un EXISTS par cible : les colonnes à False
+    correspondent aux triplets (logement, type, période) à créer.
+    """
+    annotations = {
+        f'existe_{index}': Exists(
+            Cotisation.objects.filter(
+                logement=OuterRef('pk'),
+                type_cotisation=type_cotisation,
+                periode=periode,
+            )
+        )
+        for index, (type_cotisation, periode, echeance) in enumerate(cibles)
+    }
+
+    lignes = association.logements.order_by().annotate(**annotations).values_list('pk', *annotations)
+
+    aujourd_hui = date.today()
+    manquantes = []
+    for logement_id, *existantes in lignes:
+        for (type_cotisation, periode, echeance), existe in zip(cibles, existantes):
+            if existe:
+                continue
+            manquantes.append(Cotisation(
+                logement_id=logement_id,
+                type_cotisation=type_cotisation,
+                periode=periode,
+                montant=type_cotisation.montant,
+                date_echeance=echeance,
+                # bulk_create ne passe pas par Cotisation.save()
+                statut='retard' if echeance < aujourd_hui else 'due',
+            ))
+
+    return manquantes
+
+
+def generer_cotisations_association(association, cibles, taille_lot=TAILLE_LOT_COTISATIONS):
+    """
+    Créer en masse les cotisations manquantes d'une association
+    cibles: liste de (type_cotisation, periode, date_echeance)
+    Retourne le nombre de cotisations réellement insérées
+    """
+    if not cibles:
+        return 0
+
+    cotisations_cibles = Cotisation.objects.filter(logement__association=association).filter(reduce(or_, (
+        Q(type_cotisation=type_cotisation, periode=periode) for type_cotisation, periode, _ in cibles
+    )))
+
+    with transaction.atomic():
+        manquantes = _cotisations_manquantes(association, cibles)
+        if not manquantes:
+            return 0
+        existantes = cotisations_cibles.count()
+
+        # ignore_conflicts s'appuie sur unique_together (logement, type, période)
+        # pour rester idempotent face à une génération concurrente ; les lignes
+        # écartées sur conflit ne sont pas comptées (nouveau comptage après l'insertion)
+        Cotisation.objects.bulk_create(manquantes, batch_size=taille_lot, ignore_conflicts=True)
+        creees = cotisations_cibles.count() - existantes
+
+        # bulk_create n'envoie pas de signaux
+        invalider_tableaux_bord_residents(cotisation.logement_id for cotisation in manquantes)
+        programmer_recalcul_resumes(
+            (association.id, cotisation.periode, cotisation.type_cotisation_id) for cotisation in manquantes
+        )
+
+    return creees
+
+
+def generer_cotisations_en_masse(associations, calculer_cibles, taille_lot=TAILLE_LOT_COTISATIONS):
+    """
+    Générer les cotisations de plusieurs associations
+    calculer_cibles: fonction association -> liste de (type_cotisation, periode, date_echeance)
+    Retourne {association_id: nombre de cotisations créées}
+    """
+    resultats = {}
+    for association in associations:
+        resultats[association.id] = generer_cotisations_association(
+            association,
+            calculer_cibles(association),
+            taille_lot=taille_lot,
+        )
+    return resultats
+
+
+def _basculer_statut(queryset, nouveau_statut, taille_lot):
+    """
+    Basculer le statut des cotisations du queryset par lots
+    Un SELECT des clés (index statut, date_echeance) puis un UPDATE par lot,
+    pour ne jamais verrouiller toute la table dans une seule transaction
+    """
+    total = 0
+    while True:
+        lignes = dict(queryset.order_by().values_list('pk', 'logement_id')[:taille_lot])
+        if not lignes:
+            return total
+
+        # Le filtre du queryset est répété pour ignorer les lignes modifiées entre-temps
+        total += queryset.filter(pk__in=lignes).update(
+            statut=nouveau_statut,
+            date_modification=timezone.now(),
+        )
+        invalider_tableaux_bord_residents(lignes.values())
+        programmer_recalcul_resumes_cotisations(lignes)
+
+
+def mettre_a_jour_statuts(aujourd_hui=None, taille_lot=TAILLE_LOT_STATUTS):
+    """
+    Mettre à jour en masse les statuts de retard, sans passer par Cotisation.save()
+    - due -> retard quand l'échéance est dépassée
+    - retard -> due quand l'échéance a été reportée
+    Retourne (nombre passé en retard, nombre rétabli en due)
+    """
+    aujourd_hui = aujourd_hui or date.today()
+
+    en_retard = _basculer_statut(
+        Cotisation.objects.filter(statut='due', date_echeance__lt=aujourd_hui),
+        'retard',
+        taille_lot,
+    )
+    retablies = _basculer_statut(
+        Cotisation.objects.filter(statut='retard', date_echeance__gte=aujourd_hui),
+        'due',
+        taille_lot,
+    )
+
+    return en_retard, retablies
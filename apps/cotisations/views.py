@@ -5,9 +5,24 @@ from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 
 from .models import Cotisation, TypeCotisation
+from .utils import generer_cotisations_association
+from iltizem.exports import TAILLE_LOT_EXPORT, reponse_csv_streaming
 from apps.associations.models import Association
 
 
+def _filtrer_cotisations(cotisations, params):
+    """Filtres communs à la liste et à l'export (statut, logement)"""
+    statut = params.get('statut')
+    logement = params.get('logement')
+
+    if statut:
+        cotisations = cotisations.filter(statut=statut)
+    if logement:
+        cotisations = cotisations.filter(logement__numero=logement)
+
+    return cotisations
+
+
 @login_required
 def liste_cotisations(request):
     """Liste des cotisations avec filtres"""
@@ -19,14 +34,7 @@ def liste_cotisations(request):
     else:
         cotisations = Cotisation.objects.none()
 
-    # Filtres
-    statut = request.GET.get('statut')
-    logement = request.GET.get('logement')
-
-    if statut:
-        cotisations = cotisations.filter(statut=statut)
-    if logement:
-        cotisations = cotisations.filter(logement__numero=logement)
+    cotisations = _filtrer_cotisations(cotisations, request.GET)
 
     context = {
         'cotisations': cotisations[:100],
@@ -36,6 +44,41 @@ def liste_cotisations(request):
     return render(request, 'cotisations/liste.html', context)
 
 
+@login_required
+def exporter_cotisations_csv(request):
+    """Export CSV en flux des cotisations filtrées, lues depuis un curseur (mémoire constante)"""
+    if request.user.role != 'admin_association':
+        messages.error(request, "Accès non autorisé")
+        return redirect('home')
+
+    association = get_object_or_404(Association, admin_principal=request.user)
+    cotisations = _filtrer_cotisations(
+        Cotisation.objects.filter(logement__association=association),
+        request.GET
+    ).order_by('-periode', 'logement__numero')
+
+    valeurs = cotisations.values_list(
+        'logement__numero',
+        'logement__resident__first_name',
+        'logement__resident__last_name',
+        'type_cotisation__nom',
+        'periode',
+        'montant',
+        'date_echeance',
+        'statut',
+    ).iterator(chunk_size=TAILLE_LOT_EXPORT)
+
+    statuts = dict(Cotisation.STATUT_CHOICES)
+
+    def lignes():
+        yield ['Logement', 'Résident', 'Type', 'Période', 'Montant', 'Échéance', 'Statut']
+        for numero, prenom, nom, type_nom, periode, montant, echeance, statut in valeurs:
+            resident = ' '.join(filter(None, [prenom, nom])) or 'Non assigné'
+            yield [numero, resident, type_nom, periode, montant, echeance, statuts.get(statut, statut)]
+
+    return reponse_csv_streaming(f"cotisations_{association.id}_{date.today():%Y-%m-%d}.csv", lignes())
+
+
 @login_required
 def generer_cotisations(request):
     """Générer les cotisations pour la période suivante"""
@@ -63,20 +106,11 @@ def generer_cotisations(request):
         else:  # annuelle
             echeance = periode_date + relativedelta(years=1, day=10)
 
-        # Créer les cotisations pour tous les logements
-        created_count = 0
-        for logement in association.logements.all():
-            cotisation, created = Cotisation.objects.get_or_create(
-                logement=logement,
-                type_cotisation=type_cotisation,
-                periode=periode_date,
-                defaults={
-                    'montant': type_cotisation.montant,
-                    'date_echeance': echeance,
-                }
-            )
-            if created:
-                created_count += 1
+        # Créer en masse les cotisations manquantes pour tous les logements
+        created_count = generer_cotisations_association(
+            association,
+            [(type_cotisation, periode_date, echeance)]
+        )
 
         messages.success(request, f"{created_count} cotisations générées pour {periode_date.strftime('%B %Y')}")
         return redirect('cotisations:liste')
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from .models import NotificationTemplate, NotificationLog
 
@@ -69,7 +70,7 @@ class NotificationLogAdmin(admin.ModelAdmin):
     def retry_erreurs(self, request, queryset):
         """Réessayer les notifications en erreur"""
         erreurs = queryset.filter(statut='erreur')
-        updated = erreurs.update(statut='en_attente')
+        updated = erreurs.update(statut='en_attente', date_programmee=timezone.now())
         self.message_user(request, f'{updated} notification(s) remise(s) en attente.')
 
     retry_erreurs.short_description = "Réessayer les erreurs"
\ No newline at end of file
@@ -8,7 +8,7 @@ class NotificationTemplateForm(forms.ModelForm):
 
     class Meta:
         model = NotificationTemplate
-        fields = ['nom', 'type_notification', 'sujet', 'contenu', 'actif']
+        fields = ['nom', 'type_notification', 'sujet', 'message', 'actif']
         widgets = {
             'nom': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -19,7 +19,7 @@ class NotificationTemplateForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Sujet du message'
             }),
-            'contenu': forms.Textarea(attrs={
+            'message': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 10,
                 'placeholder': 'Contenu du message...\nUtilisez {{variable}} pour les données dynamiques'
@@ -27,16 +27,16 @@ class NotificationTemplateForm(forms.ModelForm):
             'actif': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
-    def clean_contenu(self):
+    def clean_message(self):
         """Valider le template Django"""
-        contenu = self.cleaned_data.get('contenu')
-        if contenu:
+        message = self.cleaned_data.get('message')
+        if message:
             try:
                 from django.template import Template
-                Template(contenu)
+                Template(message)
             except Exception as e:
                 raise ValidationError(f"Erreur dans le template: {e}")
-        return contenu
+        return message
 
 
 class EnvoiNotificationForm(forms.Form):
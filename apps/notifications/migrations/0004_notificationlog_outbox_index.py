@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_alter_notificationlog_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['statut', 'date_programmee'], name='iltizem_not_statut_8dbe91_idx'),
+        ),
+    ]
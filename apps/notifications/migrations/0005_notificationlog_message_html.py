@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+def marquer_rappels_html(apps, schema_editor):
+    """Les rappels automatiques déjà journalisés contiennent le template HTML rendu"""
+    NotificationLog = apps.get_model('notifications', 'NotificationLog')
+    NotificationLog.objects.filter(
+        template__isnull=True,
+        sujet__startswith='Rappel - Cotisation en retard',
+    ).update(message_html=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notificationlog_outbox_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationlog',
+            name='message_html',
+            field=models.BooleanField(default=False, verbose_name='Message au format HTML'),
+        ),
+        migrations.RunPython(marquer_rappels_html, migrations.RunPython.noop),
+    ]
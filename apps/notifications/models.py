@@ -1,8 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.template import Template, Context
+from django.template import Context
 from django.utils import timezone
 
+from .utils import cache_templates
+
 User = get_user_model()
 
 
@@ -66,9 +68,24 @@ class NotificationTemplate(models.Model):
     def __str__(self):
         return f"{self.nom} ({self.get_type_notification_display()})"
 
+    def save(self, *args, **kwargs):
+        """
+        Override save pour invalider le template compilé en cache
+        La date de modification sert de version dans la clé du cache
+        """
+        self.date_modification = timezone.now()
+        super().save(*args, **kwargs)
+        cache_templates.invalider(self.pk)
+
+    def delete(self, *args, **kwargs):
+        template_id = self.pk
+        result = super().delete(*args, **kwargs)
+        cache_templates.invalider(template_id)
+        return result
+
     def render_message(self, context_data):
         try:
-            template = Template(self.message)
+            template = cache_templates.get(self, 'message')
             context = Context(context_data)
             return template.render(context)
         except Exception as e:
@@ -76,7 +93,7 @@ class NotificationTemplate(models.Model):
 
     def render_sujet(self, context_data):
         try:
-            template = Template(self.sujet)
+            template = cache_templates.get(self, 'sujet')
             context = Context(context_data)
             return template.render(context)
         except Exception as e:
@@ -86,6 +103,9 @@ class NotificationTemplate(models.Model):
 class NotificationLog(models.Model):
     """Journal des notifications envoyées - Traçabilité complète"""
 
+    # Nombre maximal de tentatives d'envoi avant abandon
+    TENTATIVES_MAX = 3
+
     STATUT_CHOICES = [
         ('en_attente', 'En attente'),
         ('envoye', 'Envoyé'),
@@ -124,6 +144,8 @@ class NotificationLog(models.Model):
     canal = models.CharField(max_length=10,default='email', verbose_name='Canal utilisé')
     sujet = models.CharField(max_length=200, verbose_name='Sujet')
     message = models.TextField(null= True, verbose_name='Message envoyé')
+    # Message HTML (rappels rendus depuis un template) : renvoyé en multipart par l'outbox
+    message_html = models.BooleanField(default=False, verbose_name='Message au format HTML')
 
     email_destinataire = models.EmailField(blank=True, verbose_name='Email')
     telephone_destinataire = models.CharField(max_length=15, blank=True, verbose_name='Téléphone')
@@ -157,6 +179,7 @@ class NotificationLog(models.Model):
         indexes = [
             models.Index(fields=['association', 'statut']),
             models.Index(fields=['destinataire', 'date_envoi']),
+            models.Index(fields=['statut', 'date_programmee']),
         ]
 
     def __str__(self):
@@ -175,4 +198,4 @@ class NotificationLog(models.Model):
         self.save()
 
     def peut_reessayer(self):
-        return self.statut == 'erreur' and self.tentatives < 3
+        return self.statut == 'erreur' and self.tentatives < self.TENTATIVES_MAX
@@ -0,0 +1,292 @@
+"""
+Tâches Celery des notifications
+- Rappels automatiques des cotisations en retard
+- Livraison des notifications en attente (outbox)
+- Relance des notifications en erreur avec backoff exponentiel
+"""
+
+import logging
+import random
+from itertools import groupby
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+from datetime import date, timedelta
+
+from apps.cotisations.models import Cotisation
+from apps.cotisations.utils import mettre_a_jour_statuts
+from .models import NotificationLog
+
+logger = logging.getLogger('iltizem')
+
+# Nombre d'emails envoyés par appel à send_messages()
+TAILLE_LOT_EMAILS = 100
+
+# Nombre de cotisations lues par aller-retour avec la base
+TAILLE_LOT_LECTURE = 2000
+
+# Nombre maximal de lots livrés par exécution de la tâche outbox
+LOTS_MAX_PAR_LIVRAISON = 50
+
+# Délai avant la première relance, doublé à chaque tentative
+DELAI_BASE_RELANCE = timedelta(minutes=5)
+
+# Nombre de logs en erreur reprogrammés par transaction
+TAILLE_LOT_RELANCES = 500
+
+
+def _construire_email(sujet, message, destinataire, connection, html=False):
+    """Email d'un message ; un message HTML part avec sa version texte et l'alternative text/html"""
+    if not html:
+        return EmailMessage(sujet, message, settings.DEFAULT_FROM_EMAIL, [destinataire], connection=connection)
+
+    email = EmailMultiAlternatives(
+        sujet,
+        strip_tags(message),
+        settings.DEFAULT_FROM_EMAIL,
+        [destinataire],
+        connection=connection,
+    )
+    email.attach_alternative(message, 'text/html')
+    return email
+
+
+def _envoyer_lot(connection, lot):
+    """
+    Envoyer un lot de (message, log) sur une connexion déjà ouverte
+    puis écrire les logs et marquer les cotisations rappelées en masse
+    Un message à la fois : un échec ne marque en erreur que son propre log,
+    jamais les messages déjà remis (qui seraient sinon renvoyés par la relance)
+    lot: liste de (cotisation_id, EmailMultiAlternatives, NotificationLog)
+    Retourne (nombre envoyé, nombre en erreur)
+    """
+    envoyes = 0
+    erreurs = 0
+    logs = []
+    for _, message, log in lot:
+        log.tentatives = 1
+        try:
+            connection.send_messages([message])
+        except Exception as e:
+            log.statut = 'erreur'
+            log.erreur_message = str(e)
+            erreurs += 1
+            logger.warning("Erreur envoi rappel à %s: %s", log.email_destinataire, e)
+        else:
+            log.statut = 'envoye'
+            log.date_envoi = timezone.now()
+            envoyes += 1
+        logs.append(log)
+    NotificationLog.objects.bulk_create(logs)
+
+    # Les logs en erreur sont repris par relancer_notifications_en_erreur :
+    # la cotisation est marquée rappelée dans tous les cas pour éviter les doublons
+    Cotisation.objects.filter(pk__in=[cotisation_id for cotisation_id, _, _ in lot]).update(
+        date_dernier_rappel=timezone.now()
+    )
+
+    return envoyes, erreurs
+
+
+@shared_task
+def envoyer_rappels_automatiques():
+    """
+    Envoyer des rappels pour les cotisations en retard
+    Les cotisations sont lues en flux et groupées par association,
+    les emails partent par lots sur une seule connexion SMTP
+    """
+    # Statuts de retard à jour avant la sélection
+    mettre_a_jour_statuts()
+
+    # Cotisations en retard (échéance dépassée de 7 jours), pas encore rappelées
+    date_limite = date.today() - timedelta(days=7)
+
+    cotisations_retard = Cotisation.objects.filter(
+        statut='retard',
+        date_echeance__lt=date_limite,
+        date_dernier_rappel__isnull=True,
+        logement__resident__isnull=False,
+    ).exclude(
+        logement__resident__email=''
+    ).select_related(
+        'logement__resident',
+        'logement__association',
+        'type_cotisation',
+    ).order_by('logement__association_id', 'pk')
+
+    template = get_template('emails/rappel_retard.html')
+    connection = get_connection()
+    connection.open()
+
+    total_envoyes = 0
+    total_erreurs = 0
+    try:
+        cotisations = cotisations_retard.iterator(chunk_size=TAILLE_LOT_LECTURE)
+        for association_id, groupe in groupby(cotisations, key=lambda c: c.logement.association_id):
+            lot = []
+            for cotisation in groupe:
+                resident = cotisation.logement.resident
+                association = cotisation.logement.association
+
+                sujet = f"Rappel - Cotisation en retard - {association.nom}"
+                message = template.render({
+                    'resident': resident,
+                    'cotisation': cotisation,
+                    'association': association,
+                })
+
+                email = _construire_email(sujet, message, resident.email, connection, html=True)
+
+                log = NotificationLog(
+                    association_id=association_id,
+                    destinataire=resident,
+                    type_notification='email',
+                    canal='email',
+                    sujet=sujet,
+                    message=message,
+                    message_html=True,
+                    email_destinataire=resident.email,
+                )
+                lot.append((cotisation.pk, email, log))
+
+                if len(lot) >= TAILLE_LOT_EMAILS:
+                    envoyes, erreurs = _envoyer_lot(connection, lot)
+                    total_envoyes += envoyes
+                    total_erreurs += erreurs
+                    lot = []
+
+            if lot:
+                envoyes, erreurs = _envoyer_lot(connection, lot)
+                total_envoyes += envoyes
+                total_erreurs += erreurs
+    finally:
+        connection.close()
+
+    return f"Rappels envoyés pour {total_envoyes} cotisations ({total_erreurs} en erreur)"
+
+
+def _livrer_lot_outbox(connection):
+    """
+    Réserver et livrer un lot de notifications en attente
+    Les lignes sont verrouillées avec SKIP LOCKED : plusieurs workers
+    consomment la file en parallèle sans jamais livrer deux fois le même log
+    Une date_programmee vide (remise en attente depuis l'admin) vaut « dès que possible »
+    Retourne (nombre envoyé, nombre en erreur), (0, 0) quand la file est vide
+    """
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        logs = list(
+            NotificationLog.objects.select_for_update(skip_locked=True).filter(
+                Q(date_programmee__isnull=True) | Q(date_programmee__lte=maintenant),
+                statut='en_attente',
+            ).order_by('date_programmee')[:TAILLE_LOT_EMAILS]
+        )
+        if not logs:
+            return 0, 0
+
+        envoyes = 0
+        erreurs = 0
+        for log in logs:
+            log.tentatives += 1
+            if not log.email_destinataire:
+                log.statut = 'erreur'
+                log.erreur_message = "Aucune adresse email"
+                erreurs += 1
+                continue
+
+            try:
+                connection.send_messages([_construire_email(
+                    log.sujet,
+                    log.message or '',
+                    log.email_destinataire,
+                    connection,
+                    html=log.message_html,
+                )])
+            except Exception as e:
+                log.statut = 'erreur'
+                log.erreur_message = str(e)
+                erreurs += 1
+            else:
+                log.statut = 'envoye'
+                log.date_envoi = timezone.now()
+                log.erreur_message = ''
+                envoyes += 1
+
+        NotificationLog.objects.bulk_update(
+            logs, ['statut', 'date_envoi', 'tentatives', 'erreur_message']
+        )
+
+    return envoyes, erreurs
+
+
+@shared_task
+def livrer_notifications_en_attente():
+    """
+    Consommer la file des notifications programmées (statut en_attente)
+    Les vues ne font qu'insérer les logs ; l'envoi se fait ici, par lots
+    """
+    connection = get_connection()
+    connection.open()
+
+    total_envoyes = 0
+    total_erreurs = 0
+    try:
+        for _ in range(LOTS_MAX_PAR_LIVRAISON):
+            envoyes, erreurs = _livrer_lot_outbox(connection)
+            if not envoyes and not erreurs:
+                break
+            total_envoyes += envoyes
+            total_erreurs += erreurs
+    finally:
+        connection.close()
+
+    return f"Notifications livrées: {total_envoyes} ({total_erreurs} en erreur)"
+
+
+def calculer_delai_relance(tentatives):
+    """
+    Délai avant la prochaine tentative : backoff exponentiel avec jitter
+    5 min après le 1er échec, 10 min après le 2e... plus jusqu'à 50% aléatoires
+    pour étaler les relances après une panne SMTP
+    """
+    delai = DELAI_BASE_RELANCE * (2 ** max(tentatives - 1, 0))
+    return delai + delai * random.uniform(0, 0.5)
+
+
+@shared_task
+def relancer_notifications_en_erreur():
+    """
+    Reprogrammer les notifications en erreur qui peuvent être réessayées
+    Elles repassent en attente avec une date_programmee différée,
+    la tâche outbox se charge ensuite de la livraison
+    """
+    total_relances = 0
+    while True:
+        maintenant = timezone.now()
+        with transaction.atomic():
+            logs = list(
+                NotificationLog.objects.select_for_update(skip_locked=True).filter(
+                    statut='erreur',
+                    tentatives__lt=NotificationLog.TENTATIVES_MAX,
+                ).exclude(
+                    email_destinataire=''
+                ).order_by('pk')[:TAILLE_LOT_RELANCES]
+            )
+            if not logs:
+                break
+
+            for log in logs:
+                log.statut = 'en_attente'
+                log.date_programmee = maintenant + calculer_delai_relance(log.tentatives)
+
+            NotificationLog.objects.bulk_update(logs, ['statut', 'date_programmee'])
+
+        total_relances += len(logs)
+
+    return f"Notifications reprogrammées: {total_relances}"
@@ -0,0 +1,62 @@
+"""
+Utilitaires pour les notifications
+"""
+
+import threading
+from collections import OrderedDict
+from django.template import Template
+
+# Nombre maximal de templates compilés gardés en mémoire par processus
+TAILLE_CACHE_TEMPLATES = 256
+
+
+class CacheTemplatesCompiles:
+    """
+    Cache LRU des templates Django compilés, par processus
+    Clé: (id du template, date_modification, champ)
+
+    La date de modification fait partie de la clé : un template modifié dans
+    un autre processus n'est jamais servi périmé, l'ancienne entrée finit
+    simplement évincée.
+    """
+
+    def __init__(self, taille_max=TAILLE_CACHE_TEMPLATES):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, notification_template, champ):
+        """Template compilé pour un champ ('sujet' ou 'message') du NotificationTemplate"""
+        if notification_template.pk is None:
+            return Template(getattr(notification_template, champ) or '')
+
+        cle = (notification_template.pk, notification_template.date_modification, champ)
+        with self._verrou:
+            template = self._entrees.get(cle)
+            if template is not None:
+                self._entrees.move_to_end(cle)
+                return template
+
+        # Compilation hors verrou ; une erreur de syntaxe n'est pas mise en cache
+        template = Template(getattr(notification_template, champ) or '')
+
+        with self._verrou:
+            self._entrees[cle] = template
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+        return template
+
+    def invalider(self, template_id):
+        """Retirer toutes les versions compilées d'un template"""
+        with self._verrou:
+            for cle in [cle for cle in self._entrees if cle[0] == template_id]:
+                del self._entrees[cle]
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+cache_templates = CacheTemplatesCompiles()
@@ -4,16 +4,25 @@ from django.contrib import messages
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.http import JsonResponse
+from django.utils import timezone
 from datetime import date, timedelta
+import logging
 
 from .models import NotificationTemplate, NotificationLog
+from .tasks import livrer_notifications_en_attente
 from .forms import NotificationTemplateForm, EnvoiNotificationForm, FiltresNotificationLogForm
 from apps.associations.models import Association
 from apps.cotisations.models import Cotisation
 from apps.accounts.models import User
 
+logger = logging.getLogger('iltizem')
+
+# Nombre de logs insérés par requête lors de la mise en file
+TAILLE_LOT_PROGRAMMATION = 500
+
 
 @login_required
 def liste_notifications(request):
@@ -114,9 +123,37 @@ def modifier_template(request, template_id):
     return render(request, 'notifications/template_form.html', context)
 
 
+def _reveiller_livraison():
+    """
+    Lancer la livraison sans attendre le beat ; broker indisponible : les logs sont
+    déjà enregistrés, le prochain passage du beat les livrera
+    """
+    try:
+        livrer_notifications_en_attente.delay()
+    except Exception:
+        logger.exception("Livraison immédiate des notifications non programmée (broker indisponible)")
+
+
+def _programmer_notifications(logs):
+    """
+    Insérer en masse des logs en attente dans la file d'envoi (outbox)
+    La livraison est faite par la tâche livrer_notifications_en_attente
+    """
+    maintenant = timezone.now()
+    for log in logs:
+        log.statut = 'en_attente'
+        log.date_programmee = maintenant
+
+    NotificationLog.objects.bulk_create(logs, batch_size=TAILLE_LOT_PROGRAMMATION)
+
+    # Réveiller un worker sans attendre le prochain passage du beat
+    transaction.on_commit(_reveiller_livraison)
+    return len(logs)
+
+
 @login_required
 def envoyer_notification(request):
-    """Envoyer une notification ponctuelle"""
+    """Programmer une notification ponctuelle (envoi asynchrone)"""
     if request.user.role not in ['super_admin', 'admin_association']:
         messages.error(request, "Accès non autorisé")
         return redirect('home')
@@ -126,85 +163,51 @@ def envoyer_notification(request):
         if form.is_valid():
             template = form.cleaned_data['template']
             critere = form.cleaned_data['critere']
+            association = form.cleaned_data.get('association')
 
-            # Déterminer les destinataires selon le critère
+            # Déterminer les destinataires (id, email) selon le critère
+            residents = User.objects.none()
             destinataires = []
 
             if critere == 'tous':
-                residents = User.objects.filter(role='resident', is_active=True, email__isnull=False)
-                destinataires = [r.email for r in residents if r.email]
+                residents = User.objects.filter(role='resident', is_active=True)
 
             elif critere == 'retard':
-                cotisations_retard = Cotisation.objects.filter(statut='retard')
-                residents = User.objects.filter(
-                    logement__cotisations__in=cotisations_retard,
-                    email__isnull=False
-                ).distinct()
-                destinataires = [r.email for r in residents if r.email]
+                residents = User.objects.filter(logement__cotisations__statut='retard').distinct()
 
             elif critere == 'association':
-                association = form.cleaned_data.get('association')
                 if association:
-                    residents = User.objects.filter(
-                        logement__association=association,
-                        email__isnull=False
-                    )
-                    destinataires = [r.email for r in residents if r.email]
+                    residents = User.objects.filter(logement__association=association)
 
             elif critere == 'manuel':
                 emails_saisis = form.cleaned_data['destinataires']
-                destinataires = [email.strip() for email in emails_saisis.split(',') if email.strip()]
-
-            # Envoyer les notifications
-            count_envoyes = 0
-            for email in destinataires:
-                try:
-                    # Context simple pour le template
-                    context = {
-                        'destinataire': email,
-                        'association': form.cleaned_data.get('association'),
-                    }
-
-                    contenu_rendu = template.render(context)
-
-                    # Envoyer l'email
-                    send_mail(
-                        subject=template.sujet,
-                        message=contenu_rendu,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[email],
-                        fail_silently=False
-                    )
-
-                    # Logger la notification
-                    NotificationLog.objects.create(
-                        type_notification='email',
-                        destinataire=email,
-                        sujet=template.sujet,
-                        contenu=contenu_rendu,
-                        statut='envoye',
-                        template=template,
-                        association=form.cleaned_data.get('association'),
-                        envoye_par=request.user
-                    )
-
-                    count_envoyes += 1
-
-                except Exception as e:
-                    # Logger l'erreur
-                    NotificationLog.objects.create(
-                        type_notification='email',
-                        destinataire=email,
-                        sujet=template.sujet,
-                        contenu=template.contenu,
-                        statut='erreur',
-                        erreur_message=str(e),
-                        template=template,
-                        association=form.cleaned_data.get('association'),
-                        envoye_par=request.user
-                    )
-
-            messages.success(request, f"{count_envoyes} notification(s) envoyée(s) avec succès")
+                destinataires = [(None, email.strip()) for email in emails_saisis.split(',') if email.strip()]
+
+            if critere != 'manuel':
+                destinataires = residents.exclude(email='').values_list('id', 'email').iterator()
+
+            # Rendu avec le template compilé une seule fois, puis mise en file
+            logs = []
+            for destinataire_id, email in destinataires:
+                context = {
+                    'destinataire': email,
+                    'association': association,
+                }
+                logs.append(NotificationLog(
+                    type_notification='email',
+                    destinataire_id=destinataire_id,
+                    email_destinataire=email,
+                    sujet=template.render_sujet(context),
+                    message=template.render_message(context),
+                    template=template,
+                    association=association,
+                    envoye_par=request.user
+                ))
+
+            with transaction.atomic():
+                count_programmes = _programmer_notifications(logs)
+
+            messages.success(request, f"{count_programmes} notification(s) programmée(s) pour envoi")
             return redirect('notifications:logs')
 
     else:
@@ -258,7 +261,7 @@ def logs_notifications(request):
 
 @login_required
 def envoyer_rappels(request):
-    """Envoyer des rappels automatiques"""
+    """Programmer des rappels pour les cotisations en retard (envoi asynchrone)"""
     if request.user.role not in ['super_admin', 'admin_association']:
         messages.error(request, "Accès non autorisé")
         return redirect('home')
@@ -284,56 +287,39 @@ def envoyer_rappels(request):
             messages.error(request, "Template 'Rappel Retard' introuvable")
             return redirect('notifications:liste')
 
-        count_envoyes = 0
-
-        for cotisation in cotisations_retard:
-            if cotisation.logement.resident and cotisation.logement.resident.email:
-                try:
-                    context = {
-                        'resident': cotisation.logement.resident,
-                        'cotisation': cotisation,
-                        'association': cotisation.logement.association,
-                    }
-
-                    contenu_rendu = template.render(context)
-
-                    send_mail(
-                        subject=template.sujet,
-                        message=contenu_rendu,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[cotisation.logement.resident.email],
-                        fail_silently=False
-                    )
-
-                    # Logger
-                    NotificationLog.objects.create(
-                        type_notification='email',
-                        destinataire=cotisation.logement.resident.email,
-                        sujet=template.sujet,
-                        contenu=contenu_rendu,
-                        statut='envoye',
-                        template=template,
-                        association=cotisation.logement.association,
-                        envoye_par=request.user
-                    )
-
-                    count_envoyes += 1
-
-                except Exception as e:
-                    # Logger l'erreur
-                    NotificationLog.objects.create(
-                        type_notification='email',
-                        destinataire=cotisation.logement.resident.email,
-                        sujet=template.sujet,
-                        contenu=template.contenu,
-                        statut='erreur',
-                        erreur_message=str(e),
-                        template=template,
-                        association=cotisation.logement.association,
-                        envoye_par=request.user
-                    )
-
-        messages.success(request, f"{count_envoyes} rappel(s) envoyé(s)")
+        cotisations_retard = cotisations_retard.filter(
+            logement__resident__isnull=False
+        ).exclude(
+            logement__resident__email=''
+        ).select_related(
+            'logement__resident', 'logement__association', 'type_cotisation'
+        )
+
+        # Rendu avec le template compilé une seule fois, puis mise en file
+        logs = []
+        for cotisation in cotisations_retard.iterator():
+            resident = cotisation.logement.resident
+            context = {
+                **cotisation.get_context_notification(),
+                'resident': resident,
+                'cotisation': cotisation,
+                'association': cotisation.logement.association,
+            }
+            logs.append(NotificationLog(
+                type_notification='email',
+                destinataire=resident,
+                email_destinataire=resident.email,
+                sujet=template.render_sujet(context),
+                message=template.render_message(context),
+                template=template,
+                association=cotisation.logement.association,
+                envoye_par=request.user
+            ))
+
+        with transaction.atomic():
+            count_programmes = _programmer_notifications(logs)
+
+        messages.success(request, f"{count_programmes} rappel(s) programmé(s) pour envoi")
         return redirect('notifications:logs')
 
     # Compter les cotisations en retard
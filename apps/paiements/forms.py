@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from datetime import date
+from decimal import Decimal
 from .models import Paiement
 
 
@@ -52,6 +53,82 @@ class PaiementForm(forms.ModelForm):
         return date_paiement
 
 
+class PaiementLotForm(forms.Form):
+    """En-tête de la saisie en lot (mode caisse) : date commune à toutes les lignes"""
+
+    date_paiement = forms.DateField(
+        widget=forms.DateInput(attrs={
+            'class': 'form-control',
+            'type': 'date'
+        }),
+        label='Date des paiements'
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['date_paiement'].initial = date.today()
+
+    def clean_date_paiement(self):
+        date_paiement = self.cleaned_data.get('date_paiement')
+        if date_paiement and date_paiement > date.today():
+            raise ValidationError("La date de paiement ne peut pas être dans le futur.")
+        return date_paiement
+
+
+class LignePaiementForm(forms.Form):
+    """Une ligne de la saisie en lot : (cotisation, montant, méthode, référence)"""
+
+    cotisation_id = forms.IntegerField(widget=forms.HiddenInput())
+    montant = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0.01'),
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control',
+            'step': '0.01',
+            'min': '0'
+        })
+    )
+    methode = forms.ChoiceField(
+        choices=Paiement.METHODE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    reference = forms.CharField(
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'N° chèque, référence virement...'
+        })
+    )
+    encaisser = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+LignePaiementFormSet = forms.formset_factory(LignePaiementForm, extra=0)
+
+
+class ReleveBancaireForm(forms.Form):
+    """Import d'un relevé bancaire CSV (virements reçus)"""
+
+    fichier = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,text/csv'
+        }),
+        label='Relevé bancaire (CSV)',
+        help_text='Colonnes attendues : date, montant, référence (séparateur ; ou ,)'
+    )
+
+    def clean_fichier(self):
+        fichier = self.cleaned_data.get('fichier')
+        if fichier and not fichier.name.lower().endswith('.csv'):
+            raise ValidationError("Le relevé doit être un fichier CSV.")
+        return fichier
+
+
 class FiltresPaiementsForm(forms.Form):
     """Formulaire de filtres pour la liste des paiements"""
 
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('associations', '0003_remove_logement_unique_logement_association_and_more'),
+        ('paiements', '0003_historiquepaiement_paiement_numero_recu_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurRecu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee', models.PositiveIntegerField(verbose_name='Année')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+                ('association', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compteurs_recus', to='associations.association', verbose_name='Association')),
+            ],
+            options={
+                'verbose_name': 'Compteur de reçus',
+                'verbose_name_plural': 'Compteurs de reçus',
+                'db_table': 'iltizem_compteurs_recus',
+                'unique_together': {('association', 'annee')},
+            },
+        ),
+    ]
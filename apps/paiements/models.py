@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.utils import timezone
@@ -123,35 +123,50 @@ class Paiement(models.Model):
     def save(self, *args, **kwargs):
         """
         Override save pour actions automatiques
+        Numéro de reçu, statut de la cotisation et insertion dans une même transaction :
+        un enregistrement annulé libère son numéro (pas de trou dans la numérotation)
         """
-        # Générer numéro de reçu si pas encore fait
-        if not self.numero_recu:
-            self.numero_recu = self._generer_numero_recu()
+        with transaction.atomic():
+            # Générer numéro de reçu si pas encore fait
+            if not self.numero_recu:
+                self.numero_recu = self._generer_numero_recu()
 
-        # Marquer la cotisation comme payée
-        if self.pk is None:  # Nouveau paiement
-            self.cotisation.marquer_payee()
+            # Marquer la cotisation comme payée
+            if self.pk is None:  # Nouveau paiement
+                self.cotisation.marquer_payee()
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
     def _generer_numero_recu(self):
         """
         Générer un numéro de reçu unique
-        Format: ASSO-YYYY-NNNN
+        Format: ASSO<id>-YYYY-NNNN
         """
         association = self.get_association()
         annee = timezone.now().year
 
-        # Compter les paiements de cette année pour cette association
-        count = Paiement.objects.filter(
-            cotisation__logement__association=association,
-            date_enregistrement__year=annee
-        ).count() + 1
+        numero = CompteurRecu.allouer(association, annee).start
+        return self.formater_numero_recu(association, annee, numero)
 
-        # Préfixe association (3 premiers caractères en majuscules)
+    @staticmethod
+    def formater_numero_recu(association, annee, numero):
+        """
+        Numéro de reçu lisible
+        Préfixe association (3 premiers caractères en majuscules) suivi de son id,
+        pour que deux associations au nom proche ne partagent jamais un numéro
+        """
         prefixe = association.nom[:3].upper().replace(' ', '')
+        return f"{prefixe}{association.id}-{annee}-{numero:04d}"
 
-        return f"{prefixe}-{annee}-{count:04d}"
+    @classmethod
+    def reserver_numeros_recu(cls, association, quantite, annee=None):
+        """
+        Pré-allouer un bloc de numéros de reçu consécutifs (imports, saisie en lot)
+        Retourne la liste des numéros formatés
+        """
+        annee = annee or timezone.now().year
+        numeros = CompteurRecu.allouer(association, annee, quantite)
+        return [cls.formater_numero_recu(association, annee, numero) for numero in numeros]
 
     def generer_recu_pdf(self):
         """
@@ -264,4 +279,68 @@ class HistoriquePaiement(models.Model):
         ordering = ['-date_action']
 
     def __str__(self):
-        return f"{self.get_action_display()} - {self.paiement} - {self.date_action.strftime('%d/%m/%Y %H:%M')}"
\ No newline at end of file
+        return f"{self.get_action_display()} - {self.paiement} - {self.date_action.strftime('%d/%m/%Y %H:%M')}"
+
+
+class CompteurRecu(models.Model):
+    """
+    Compteur des numéros de reçu par association et par année
+    Une ligne verrouillée (SELECT ... FOR UPDATE) par allocation :
+    numérotation en O(1) et sans doublon entre caisses concurrentes
+    """
+
+    association = models.ForeignKey(
+        'associations.Association',
+        on_delete=models.CASCADE,
+        related_name='compteurs_recus',
+        verbose_name='Association'
+    )
+    annee = models.PositiveIntegerField(verbose_name='Année')
+    dernier_numero = models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')
+
+    class Meta:
+        verbose_name = 'Compteur de reçus'
+        verbose_name_plural = 'Compteurs de reçus'
+        db_table = 'iltizem_compteurs_recus'
+        unique_together = ['association', 'annee']
+
+    def __str__(self):
+        return f"{self.association.nom} - {self.annee} - {self.dernier_numero}"
+
+    @classmethod
+    def allouer(cls, association, annee, quantite=1):
+        """
+        Réserver `quantite` numéros consécutifs pour l'association et l'année
+        Retourne le range des numéros réservés
+        Le verrou est tenu jusqu'à la fin de la transaction englobante
+        """
+        with transaction.atomic():
+            compteur = cls._verrouiller(association, annee)
+            premier = compteur.dernier_numero + 1
+            compteur.dernier_numero += quantite
+            compteur.save(update_fields=['dernier_numero'])
+
+        return range(premier, premier + quantite)
+
+    @classmethod
+    def _verrouiller(cls, association, annee):
+        """Compteur verrouillé, créé au besoin à partir des paiements existants de l'année"""
+        try:
+            return cls.objects.select_for_update().get(association=association, annee=annee)
+        except cls.DoesNotExist:
+            pass
+
+        # Première allocation de l'année : reprendre après les reçus déjà émis
+        deja_emis = Paiement.objects.filter(
+            cotisation__logement__association=association,
+            date_enregistrement__year=annee
+        ).count()
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(association=association, annee=annee, dernier_numero=deja_emis)
+        except IntegrityError:
+            # Créé entre-temps par une autre caisse
+            pass
+
+        return cls.objects.select_for_update().get(association=association, annee=annee)
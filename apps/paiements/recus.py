@@ -0,0 +1,231 @@
+"""
+Reçus de paiement
+- Rendu PDF unique (admin, résident, impression en lot) : polices et mise en
+  page chargées une fois par processus, un ou plusieurs paiements par passe
+- Cache des PDF adressé par le contenu : le fichier est nommé d'après
+  l'empreinte des champs imprimés, il est rendu une seule fois puis servi
+  depuis le stockage (ETag / Last-Modified)
+"""
+
+import hashlib
+import posixpath
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Dossier des reçus dans le stockage par défaut (MEDIA_ROOT)
+DOSSIER_RECUS = 'recus'
+
+# À incrémenter quand la mise en page change : tous les reçus seront régénérés
+VERSION_MISE_EN_PAGE_RECU = 2
+
+# Mise en page (points PDF)
+LARGEUR_PAGE, HAUTEUR_PAGE = A4
+MARGE_GAUCHE = 50
+INTERLIGNE = 20
+
+# Relations lues par le rendu : à passer à select_related()
+PAIEMENTS_RECU_RELATIONS = (
+    'cotisation__logement__association',
+    'cotisation__logement__resident',
+    'enregistre_par',
+)
+
+
+@lru_cache(maxsize=None)
+def polices_recu():
+    """
+    (police normale, police grasse) des reçus, enregistrées une seule fois par processus
+    RECU_POLICE_TTF / RECU_POLICE_GRAS_TTF (settings) : polices TrueType optionnelles,
+    nécessaires pour imprimer les noms en caractères arabes
+    """
+    chemin_normal = getattr(settings, 'RECU_POLICE_TTF', None)
+    if not chemin_normal:
+        return 'Helvetica', 'Helvetica-Bold'
+
+    pdfmetrics.registerFont(TTFont('RecuNormal', chemin_normal))
+    chemin_gras = getattr(settings, 'RECU_POLICE_GRAS_TTF', None)
+    if not chemin_gras:
+        return 'RecuNormal', 'RecuNormal'
+    pdfmetrics.registerFont(TTFont('RecuGras', chemin_gras))
+    return 'RecuNormal', 'RecuGras'
+
+
+def _dessiner_recu(pdf, paiement):
+    """Dessiner la page d'un reçu sur un canvas ouvert"""
+    normale, grasse = polices_recu()
+    cotisation = paiement.cotisation
+    logement = cotisation.logement
+    association = logement.association
+    resident = logement.resident
+    enregistre_par = paiement.enregistre_par
+
+    # En-tête
+    pdf.setFont(grasse, 20)
+    pdf.drawString(MARGE_GAUCHE, HAUTEUR_PAGE - 80, "REÇU DE PAIEMENT")
+    pdf.setFont(normale, 11)
+    pdf.drawRightString(LARGEUR_PAGE - MARGE_GAUCHE, HAUTEUR_PAGE - 80, f"N° {paiement.numero_recu}")
+
+    # Informations association et résident
+    pdf.setFont(normale, 12)
+    pdf.drawString(MARGE_GAUCHE, HAUTEUR_PAGE - 120, f"Association: {association.nom}")
+    pdf.drawString(MARGE_GAUCHE, HAUTEUR_PAGE - 140, f"Adresse: {association.adresse}")
+    pdf.drawString(MARGE_GAUCHE, HAUTEUR_PAGE - 180, f"Résident: {resident.get_full_name() if resident else 'Non assigné'}")
+    pdf.drawString(MARGE_GAUCHE, HAUTEUR_PAGE - 200, f"Logement: {logement.numero}")
+
+    # Informations paiement
+    y = HAUTEUR_PAGE - 250
+    pdf.setFont(grasse, 14)
+    pdf.drawString(MARGE_GAUCHE, y, "DÉTAILS DU PAIEMENT")
+
+    y -= 30
+    pdf.setFont(normale, 11)
+    infos = [
+        f"Période: {cotisation.periode.strftime('%B %Y')}",
+        f"Montant: {paiement.montant} DA",
+        f"Méthode: {paiement.get_methode_display()}",
+        f"Date de paiement: {paiement.date_paiement.strftime('%d/%m/%Y')}",
+        f"Référence: {paiement.reference or 'N/A'}",
+    ]
+    for info in infos:
+        pdf.drawString(MARGE_GAUCHE, y, info)
+        y -= INTERLIGNE
+
+    # Signature (date d'enregistrement : le contenu ne dépend que du paiement)
+    y -= 40
+    pdf.drawString(MARGE_GAUCHE, y, f"Reçu émis le {paiement.date_enregistrement.strftime('%d/%m/%Y')}")
+    pdf.drawString(MARGE_GAUCHE, y - INTERLIGNE, f"Par: {enregistre_par.get_full_name() or enregistre_par.username}")
+    pdf.drawString(MARGE_GAUCHE, y - 2 * INTERLIGNE, "Signature électronique - Plateforme iltizem")
+
+
+def rendre_recus(paiements):
+    """
+    PDF d'un ou plusieurs reçus, une page par paiement, en une seule passe
+    Les paiements doivent être chargés avec select_related (voir PAIEMENTS_RECU_RELATIONS)
+    Retourne les bytes du PDF
+    """
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Reçus de paiement")
+
+    for paiement in paiements:
+        _dessiner_recu(pdf, paiement)
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def rendre_recu(paiement):
+    """PDF du reçu d'un paiement"""
+    return rendre_recus([paiement])
+
+
+def champs_recu(paiement):
+    """Valeurs imprimées sur le reçu : toute modification change l'empreinte"""
+    cotisation = paiement.cotisation
+    logement = cotisation.logement
+    association = logement.association
+    resident = logement.resident
+    enregistre_par = paiement.enregistre_par
+
+    return (
+        paiement.pk,
+        paiement.numero_recu,
+        paiement.montant,
+        paiement.methode,
+        paiement.reference,
+        paiement.date_paiement,
+        paiement.date_enregistrement,
+        cotisation.periode,
+        logement.numero,
+        association.nom,
+        association.adresse,
+        resident.get_full_name() if resident else '',
+        enregistre_par.get_full_name() or enregistre_par.username,
+    )
+
+
+def empreinte_recu(paiement):
+    """Empreinte SHA-256 des champs du reçu et de la version de mise en page"""
+    valeurs = (VERSION_MISE_EN_PAGE_RECU,) + champs_recu(paiement)
+    return hashlib.sha256('\x1f'.join(str(valeur) for valeur in valeurs).encode('utf-8')).hexdigest()
+
+
+def dossier_recus_paiement(paiement):
+    """recus/<paiement>/ : un dossier par paiement, purgé sans requête à la suppression"""
+    return posixpath.join(DOSSIER_RECUS, str(paiement.pk))
+
+
+def obtenir_recu(paiement):
+    """
+    Chemin du PDF du reçu dans le stockage, rendu seulement s'il n'existe pas encore
+    Les versions périmées du même paiement sont supprimées
+    Retourne (chemin, empreinte, nouvellement rendu)
+    """
+    empreinte = empreinte_recu(paiement)
+    dossier = dossier_recus_paiement(paiement)
+    chemin = posixpath.join(dossier, f"{empreinte}.pdf")
+
+    if default_storage.exists(chemin):
+        return chemin, empreinte, False
+
+    default_storage.save(chemin, ContentFile(rendre_recu(paiement)))
+
+    # Le paiement a changé depuis le dernier rendu : retirer l'ancienne version
+    _, fichiers = default_storage.listdir(dossier)
+    for fichier in fichiers:
+        if posixpath.join(dossier, fichier) != chemin:
+            default_storage.delete(posixpath.join(dossier, fichier))
+
+    return chemin, empreinte, True
+
+
+def supprimer_recus(paiement):
+    """Supprimer tous les PDF en cache d'un paiement"""
+    dossier = dossier_recus_paiement(paiement)
+    if not default_storage.exists(dossier):
+        return
+    _, fichiers = default_storage.listdir(dossier)
+    for fichier in fichiers:
+        default_storage.delete(posixpath.join(dossier, fichier))
+
+
+def reponse_recu(request, paiement, nom_fichier):
+    """
+    Réponse HTTP du reçu avec validation conditionnelle
+    304 sans toucher au stockage quand le client a déjà cette empreinte
+    """
+    empreinte = empreinte_recu(paiement)
+    etag = quote_etag(empreinte)
+
+    reponse = get_conditional_response(request, etag=etag)
+    if reponse is None:
+        chemin, empreinte, _ = obtenir_recu(paiement)
+        derniere_modification = int(default_storage.get_modified_time(chemin).timestamp())
+
+        reponse = get_conditional_response(request, etag=etag, last_modified=derniere_modification)
+        if reponse is None:
+            reponse = FileResponse(
+                default_storage.open(chemin, 'rb'),
+                as_attachment=True,
+                filename=nom_fichier,
+                content_type='application/pdf',
+            )
+        reponse['Last-Modified'] = http_date(derniere_modification)
+
+    reponse['ETag'] = etag
+    # Toujours revalider : le reçu change si le paiement est modifié
+    reponse['Cache-Control'] = 'private, no-cache'
+    return reponse
@@ -0,0 +1,31 @@
+"""
+Signaux des paiements
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.cotisations.models import Cotisation
+from apps.cotisations.resumes import cle_resume, programmer_recalcul_resumes
+from .models import Paiement
+from .recus import supprimer_recus
+
+
+@receiver(post_delete, sender=Paiement)
+def supprimer_recus_paiement(sender, instance, **kwargs):
+    """Un paiement supprimé n'a plus de reçu : purger ses PDF en cache"""
+    supprimer_recus(instance)
+
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def recalculer_resume_paiement(sender, instance, **kwargs):
+    """Montant encaissé et nombre de paiements du résumé financier de la cotisation"""
+    if Paiement.cotisation.is_cached(instance):
+        cle = cle_resume(instance.cotisation)
+    else:
+        cle = Cotisation.objects.filter(pk=instance.cotisation_id).values_list(
+            'logement__association_id', 'periode', 'type_cotisation_id'
+        ).first()
+    if cle and cle[0] is not None:
+        programmer_recalcul_resumes([cle])
@@ -5,6 +5,10 @@ app_name = 'paiements'
 
 urlpatterns = [
     path('', views.liste_paiements, name='liste'),
+    path('export/csv/', views.exporter_paiements_csv, name='export_csv'),
     path('enregistrer/<int:cotisation_id>/', views.enregistrer_paiement, name='enregistrer'),
+    path('enregistrer/lot/', views.enregistrer_paiements_lot, name='enregistrer_lot'),
+    path('releve/importer/', views.importer_releve, name='importer_releve'),
     path('recu/<int:paiement_id>/', views.generer_recu, name='recu'),
+    path('recus/imprimer/', views.imprimer_recus, name='imprimer_recus'),
 ]
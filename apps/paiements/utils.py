@@ -0,0 +1,373 @@
+"""
+Utilitaires pour l'enregistrement des paiements
+- Enregistrement en lot (mode caisse, API)
+- Import et rapprochement des relevés bancaires
+"""
+
+import csv
+import io
+import re
+from collections import Counter, defaultdict, deque, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cotisations.models import Cotisation
+from apps.cotisations.resumes import programmer_recalcul_resumes_cotisations
+from apps.residents.utils import invalider_tableaux_bord_residents
+from .models import Paiement
+
+# Nombre de paiements insérés par requête INSERT
+TAILLE_LOT_PAIEMENTS = 500
+
+# Nombre de lignes de relevé rapprochées puis enregistrées par transaction
+TAILLE_LOT_RELEVE = 2000
+
+# Formats de date rencontrés dans les exports bancaires
+FORMATS_DATE_RELEVE = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y']
+
+# Noms de colonnes acceptés pour chaque champ du relevé (en minuscules)
+COLONNES_RELEVE = {
+    'date': ['date', 'date operation', 'date opération', 'date valeur'],
+    'montant': ['montant', 'credit', 'crédit', 'amount'],
+    'reference': ['reference', 'référence', 'ref', 'libelle', 'libellé', 'motif'],
+}
+
+# Colonne facultative : identifiant de transaction fourni par certaines banques
+COLONNES_TRANSACTION = ['transaction', 'id transaction', 'identifiant', 'n° transaction', 'numero transaction',
+                        'numéro transaction', 'reference transaction', 'référence transaction']
+
+LigneReleve = namedtuple('LigneReleve', ['numero', 'date', 'montant', 'reference', 'transaction'])
+
+
+def enregistrer_paiements_en_lot(association, lignes, enregistre_par, date_paiement):
+    """
+    Enregistrer plusieurs paiements en une seule transaction
+    lignes: liste de dicts {cotisation_id, montant (Decimal), methode, reference}
+    et, en option, date_paiement propre à la ligne (relevés bancaires)
+
+    - cotisations verrouillées et vérifiées en une requête
+    - numéros de reçu réservés en un bloc
+    - paiements insérés avec bulk_create
+    - statuts des cotisations passés à 'payee' en un seul UPDATE
+    Lève ValidationError si une ligne ne correspond pas à une cotisation ouverte
+    de l'association ; rien n'est alors enregistré.
+    """
+    if not lignes:
+        return []
+
+    cotisation_ids = [ligne['cotisation_id'] for ligne in lignes]
+    if len(set(cotisation_ids)) != len(cotisation_ids):
+        raise ValidationError("Une même cotisation apparaît plusieurs fois dans le lot.")
+
+    with transaction.atomic():
+        logements = dict(
+            Cotisation.objects.select_for_update().filter(
+                pk__in=cotisation_ids,
+                logement__association=association,
+                statut__in=['due', 'retard'],
+            ).values_list('pk', 'logement_id')
+        )
+        ouvertes = set(logements)
+        ouvertes -= set(
+            Paiement.objects.filter(cotisation_id__in=ouvertes).values_list('cotisation_id', flat=True)
+        )
+
+        invalides = [cotisation_id for cotisation_id in cotisation_ids if cotisation_id not in ouvertes]
+        if invalides:
+            raise ValidationError(
+                "Cotisations introuvables, déjà payées ou hors de l'association: "
+                + ", ".join(str(cotisation_id) for cotisation_id in invalides)
+            )
+
+        numeros = Paiement.reserver_numeros_recu(association, len(lignes))
+
+        paiements = Paiement.objects.bulk_create([
+            Paiement(
+                cotisation_id=ligne['cotisation_id'],
+                montant=ligne['montant'],
+                methode=ligne['methode'],
+                reference=ligne.get('reference', ''),
+                date_paiement=ligne.get('date_paiement') or date_paiement,
+                enregistre_par=enregistre_par,
+                numero_recu=numero,
+            )
+            for ligne, numero in zip(lignes, numeros)
+        ], batch_size=TAILLE_LOT_PAIEMENTS)
+
+        Cotisation.objects.filter(pk__in=cotisation_ids).update(
+            statut='payee',
+            date_modification=timezone.now(),
+        )
+
+        # update() / bulk_create() n'envoient pas de signaux
+        invalider_tableaux_bord_residents(logements.values())
+        programmer_recalcul_resumes_cotisations(cotisation_ids)
+
+    return paiements
+
+
+def _normaliser(texte):
+    """Majuscules, sans espaces ni ponctuation : 'Villa 3-B' -> 'VILLA3B'"""
+    return re.sub(r'[^0-9A-Z]', '', (texte or '').upper())
+
+
+def _jetons_reference(reference):
+    """
+    Candidats numéro de logement extraits d'un libellé de virement
+    Mots isolés et paires de mots adjacents ('VILLA 3' -> 'VILLA3')
+    """
+    mots = [mot for mot in re.split(r'[^0-9A-Z]+', (reference or '').upper()) if mot]
+    jetons = set(mots)
+    jetons.update(a + b for a, b in zip(mots, mots[1:]))
+    return jetons
+
+
+def _convertir_montant(valeur):
+    """'1 500,00' ou '1500.00' -> Decimal('1500.00')"""
+    valeur = (valeur or '').replace('\xa0', '').replace(' ', '')
+    if ',' in valeur and '.' in valeur:
+        valeur = valeur.replace('.', '')
+    return Decimal(valeur.replace(',', '.')).quantize(Decimal('0.01'))
+
+
+def _convertir_date(valeur):
+    valeur = (valeur or '').strip()
+    for format_date in FORMATS_DATE_RELEVE:
+        try:
+            return datetime.strptime(valeur, format_date).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide: {valeur}")
+
+
+def lire_releve(fichier, encoding='utf-8-sig'):
+    """
+    Lire un relevé CSV en flux, ligne par ligne
+    Séparateur (; ou ,) détecté sur l'en-tête ; colonnes reconnues via COLONNES_RELEVE
+    Colonne d'identifiant de transaction facultative (COLONNES_TRANSACTION), '' si absente
+    Produit des LigneReleve, ou (numero, valeurs brutes, motif) pour les lignes illisibles
+    """
+    if isinstance(fichier, io.TextIOBase):
+        texte = fichier
+    else:
+        texte = io.TextIOWrapper(fichier, encoding=encoding, newline='')
+    entete = texte.readline()
+    separateur = ';' if entete.count(';') >= entete.count(',') else ','
+    colonnes = [colonne.strip().lower() for colonne in next(csv.reader([entete], delimiter=separateur), [])]
+
+    positions = {}
+    for champ, alias in COLONNES_RELEVE.items():
+        for nom in alias:
+            if nom in colonnes:
+                positions[champ] = colonnes.index(nom)
+                break
+    manquantes = [champ for champ in COLONNES_RELEVE if champ not in positions]
+    if manquantes:
+        raise ValidationError("Colonnes manquantes dans le relevé: " + ", ".join(manquantes))
+    position_transaction = next((colonnes.index(nom) for nom in COLONNES_TRANSACTION if nom in colonnes), None)
+
+    for numero, valeurs in enumerate(csv.reader(texte, delimiter=separateur), start=2):
+        if not any(valeurs):
+            continue
+        try:
+            yield LigneReleve(
+                numero=numero,
+                date=_convertir_date(valeurs[positions['date']]),
+                montant=_convertir_montant(valeurs[positions['montant']]),
+                reference=valeurs[positions['reference']].strip(),
+                transaction=valeurs[position_transaction].strip() if position_transaction is not None else '',
+            )
+        except (IndexError, ValueError, InvalidOperation) as e:
+            yield numero, separateur.join(valeurs), f"Ligne illisible ({e})"
+
+
+def reference_paiement(ligne):
+    """Référence enregistrée sur le paiement : l'identifiant de transaction s'il existe, sinon le libellé"""
+    return (ligne.transaction or ligne.reference)[:100]
+
+
+def cle_import(date_paiement, montant, reference):
+    """
+    Clé d'un virement importé : (date, montant, référence enregistrée)
+    Jamais le libellé seul : un résident réutilise le même libellé chaque mois
+    """
+    return date_paiement, montant, reference
+
+
+class IndexRapprochement:
+    """
+    Index en mémoire des cotisations ouvertes d'une association
+    Construit une seule fois (2 requêtes), puis chaque ligne du relevé
+    est rapprochée par recherche dans des dictionnaires
+
+    - par (numéro de logement normalisé, montant) : file des cotisations,
+      la plus ancienne période d'abord
+    - virements déjà importés, comptés par clé (date, montant, référence) : une ligne
+      réimportée est ignorée, mais deux virements identiques d'un même relevé sont
+      tous deux importés (la n-ième occurrence n'est un doublon que si la base en a déjà n) ;
+      avec un identifiant de transaction, toute répétition est un doublon
+    """
+
+    def __init__(self, association):
+        self.par_logement_montant = defaultdict(deque)
+        self.numeros = set()
+
+        cotisations = Cotisation.objects.filter(
+            logement__association=association,
+            statut__in=['due', 'retard'],
+            paiement__isnull=True,
+        ).order_by('periode', 'pk').values_list('pk', 'logement__numero', 'montant')
+
+        for cotisation_id, numero, montant in cotisations:
+            numero = _normaliser(numero)
+            self.numeros.add(numero)
+            self.par_logement_montant[(numero, montant)].append(cotisation_id)
+
+        self.virements_importes = Counter(
+            cle_import(date_paiement, montant, reference)
+            for date_paiement, montant, reference in Paiement.objects.filter(
+                cotisation__logement__association=association,
+                methode='virement',
+            ).values_list('date_paiement', 'montant', 'reference')
+        )
+        self.virements_vus = Counter()
+
+    def rapprocher(self, ligne):
+        """
+        Cotisation correspondant à une ligne de relevé
+        Retourne (cotisation_id, None) ou (None, motif du rejet)
+        La cotisation retournée est retirée de l'index (jamais rapprochée deux fois)
+        """
+        if ligne.montant <= 0:
+            return None, "Débit ou montant nul"
+
+        cle = cle_import(ligne.date, ligne.montant, reference_paiement(ligne))
+        self.virements_vus[cle] += 1
+        if ligne.transaction:
+            # Identifiant unique de la banque : toute répétition est un doublon
+            deja_importe = self.virements_vus[cle] > 1 or self.virements_importes[cle] > 0
+        else:
+            deja_importe = self.virements_vus[cle] <= self.virements_importes[cle]
+        if deja_importe:
+            return None, "Virement déjà importé"
+
+        numeros = _jetons_reference(ligne.reference) & self.numeros
+        if not numeros:
+            return None, "Aucun logement reconnu dans la référence"
+        if len(numeros) > 1:
+            return None, "Plusieurs logements possibles: " + ", ".join(sorted(numeros))
+
+        file_cotisations = self.par_logement_montant.get((numeros.pop(), ligne.montant))
+        if not file_cotisations:
+            return None, "Aucune cotisation ouverte de ce montant pour ce logement"
+
+        return file_cotisations.popleft(), None
+
+
+def _cotisations_ouvertes(association, cotisation_ids):
+    """Parmi cotisation_ids, celles de l'association encore ouvertes et sans paiement"""
+    return set(
+        Cotisation.objects.filter(
+            pk__in=cotisation_ids,
+            logement__association=association,
+            statut__in=['due', 'retard'],
+            paiement__isnull=True,
+        ).values_list('pk', flat=True)
+    )
+
+
+def _ligne_non_rapprochee(ligne, motif):
+    return {
+        'ligne': ligne.numero,
+        'date': ligne.date,
+        'montant': ligne.montant,
+        'reference': ligne.reference,
+        'motif': motif,
+    }
+
+
+def importer_releve_bancaire(association, fichier, enregistre_par):
+    """
+    Importer un relevé bancaire CSV et enregistrer les virements rapprochés
+    Lecture en flux par lots de TAILLE_LOT_RELEVE lignes, rapprochement en mémoire
+    (IndexRapprochement), une transaction enregistrer_paiements_en_lot par lot
+
+    Retourne le rapport {lignes, rapprochees, montant_rapproche, non_rapprochees}
+    non_rapprochees: liste de dicts {ligne, date, montant, reference, motif}
+    """
+    index = IndexRapprochement(association)
+    rapport = {
+        'lignes': 0,
+        'rapprochees': 0,
+        'montant_rapproche': Decimal('0'),
+        'non_rapprochees': [],
+    }
+
+    lignes_releve = lire_releve(fichier)
+    while True:
+        try:
+            lot = list(islice(lignes_releve, TAILLE_LOT_RELEVE))
+        except UnicodeDecodeError:
+            raise ValidationError("Encodage du relevé non reconnu (UTF-8 attendu).")
+        if not lot:
+            break
+        rapport['lignes'] += len(lot)
+
+        paiements = []
+        for ligne in lot:
+            if not isinstance(ligne, LigneReleve):
+                numero, brute, motif = ligne
+                rapport['non_rapprochees'].append({
+                    'ligne': numero, 'date': None, 'montant': None, 'reference': brute, 'motif': motif,
+                })
+                continue
+
+            cotisation_id, motif = index.rapprocher(ligne)
+            if cotisation_id is None:
+                rapport['non_rapprochees'].append(_ligne_non_rapprochee(ligne, motif))
+                continue
+
+            paiements.append((ligne, {
+                'cotisation_id': cotisation_id,
+                'montant': ligne.montant,
+                'methode': 'virement',
+                'reference': reference_paiement(ligne),
+                'date_paiement': ligne.date,
+            }))
+
+        try:
+            enregistrer_paiements_en_lot(
+                association,
+                [paiement for _, paiement in paiements],
+                enregistre_par=enregistre_par,
+                date_paiement=timezone.localdate(),
+            )
+        except ValidationError:
+            # Cotisations payées entre-temps par un autre utilisateur : seules ces
+            # lignes sont écartées, le reste du lot est réessayé une fois
+            ouvertes = _cotisations_ouvertes(association, [paiement['cotisation_id'] for _, paiement in paiements])
+            conflits = [(ligne, paiement) for ligne, paiement in paiements if paiement['cotisation_id'] not in ouvertes]
+            paiements = [(ligne, paiement) for ligne, paiement in paiements if paiement['cotisation_id'] in ouvertes]
+            for ligne, _ in conflits:
+                rapport['non_rapprochees'].append(_ligne_non_rapprochee(ligne, "Cotisation payée entre-temps"))
+            try:
+                enregistrer_paiements_en_lot(
+                    association,
+                    [paiement for _, paiement in paiements],
+                    enregistre_par=enregistre_par,
+                    date_paiement=timezone.localdate(),
+                )
+            except ValidationError as e:
+                for ligne, _ in paiements:
+                    rapport['non_rapprochees'].append(_ligne_non_rapprochee(ligne, e.messages[0]))
+                continue
+
+        rapport['rapprochees'] += len(paiements)
+        rapport['montant_rapproche'] += sum((ligne.montant for ligne, _ in paiements), Decimal('0'))
+
+    return rapport
@@ -1,16 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+from django.core.exceptions import ValidationError
+from django.http import FileResponse
 from io import BytesIO
-from datetime import date
+from datetime import date, datetime
 
 from .models import Paiement
+from .forms import PaiementForm, PaiementLotForm, LignePaiementFormSet, ReleveBancaireForm
+from .utils import enregistrer_paiements_en_lot, importer_releve_bancaire
+from .recus import PAIEMENTS_RECU_RELATIONS, rendre_recus, reponse_recu
 from apps.cotisations.models import Cotisation
 from apps.associations.models import Association
+from iltizem.exports import TAILLE_LOT_EXPORT, reponse_csv_streaming
 
 
 @login_required
@@ -26,28 +28,21 @@ def enregistrer_paiement(request, cotisation_id):
             return redirect('associations:tableau_bord')
 
     if request.method == 'POST':
-        # Validation simple
-        montant = float(request.POST['montant'])
-        methode = request.POST['methode']
-        date_paiement = request.POST['date_paiement']
-        reference = request.POST.get('reference', '')
-
-        # Créer le paiement
-        paiement = Paiement.objects.create(
-            cotisation=cotisation,
-            montant=montant,
-            methode=methode,
-            reference=reference,
-            date_paiement=date_paiement,
-            enregistre_par=request.user
-        )
-
-        # Mettre à jour le statut de la cotisation
-        cotisation.statut = 'payee'
-        cotisation.save()
-
-        messages.success(request, f"Paiement enregistré pour {cotisation.logement.numero}")
-        return redirect('associations:tableau_bord')
+        # Validation du formulaire (montant en Decimal)
+        form = PaiementForm(request.POST, cotisation=cotisation)
+        if form.is_valid():
+            # Créer le paiement : Paiement.save() marque aussi la cotisation payée
+            paiement = form.save(commit=False)
+            paiement.cotisation = cotisation
+            paiement.enregistre_par = request.user
+            paiement.save()
+
+            messages.success(request, f"Paiement enregistré pour {cotisation.logement.numero}")
+            return redirect('associations:tableau_bord_association')
+
+        for erreurs in form.errors.values():
+            for erreur in erreurs:
+                messages.error(request, erreur)
 
     context = {
         'cotisation': cotisation,
@@ -56,64 +51,191 @@ def enregistrer_paiement(request, cotisation_id):
     return render(request, 'paiements/enregistrer.html', context)
 
 
+@login_required
+def enregistrer_paiements_lot(request):
+    """
+    Mode caisse : enregistrer en une fois les paiements de plusieurs cotisations
+    Une seule transaction, reçus numérotés en bloc
+    """
+    if request.user.role != 'admin_association':
+        messages.error(request, "Accès non autorisé")
+        return redirect('home')
+
+    association = get_object_or_404(Association, admin_principal=request.user)
+
+    cotisations_ouvertes = Cotisation.objects.filter(
+        logement__association=association,
+        statut__in=['due', 'retard'],
+        paiement__isnull=True,
+    ).select_related('logement__resident', 'type_cotisation').order_by('logement__numero', 'periode')
+
+    periode = request.GET.get('periode')
+    if periode:
+        cotisations_ouvertes = cotisations_ouvertes.filter(periode=periode)
+
+    if request.method == 'POST':
+        form = PaiementLotForm(request.POST)
+        formset = LignePaiementFormSet(request.POST)
+
+        if form.is_valid() and formset.is_valid():
+            lignes = [ligne for ligne in formset.cleaned_data if ligne.get('encaisser')]
+
+            try:
+                paiements = enregistrer_paiements_en_lot(
+                    association,
+                    lignes,
+                    enregistre_par=request.user,
+                    date_paiement=form.cleaned_data['date_paiement'],
+                )
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+            else:
+                messages.success(request, f"{len(paiements)} paiement(s) enregistré(s)")
+                return redirect('paiements:liste')
+    else:
+        form = PaiementLotForm()
+        formset = LignePaiementFormSet(initial=[
+            {
+                'cotisation_id': cotisation.id,
+                'montant': cotisation.montant,
+                'methode': 'especes',
+            }
+            for cotisation in cotisations_ouvertes
+        ])
+
+    # Associer chaque ligne du formset à sa cotisation pour l'affichage
+    cotisations_par_id = {cotisation.id: cotisation for cotisation in cotisations_ouvertes}
+    lignes = []
+    for ligne_form in formset:
+        try:
+            cotisation_id = int(ligne_form['cotisation_id'].value())
+        except (TypeError, ValueError):
+            cotisation_id = None
+        lignes.append((ligne_form, cotisations_par_id.get(cotisation_id)))
+
+    context = {
+        'association': association,
+        'form': form,
+        'formset': formset,
+        'lignes': lignes,
+        'periode': periode,
+    }
+    return render(request, 'paiements/enregistrer_lot.html', context)
+
+
+@login_required
+def importer_releve(request):
+    """
+    Importer un relevé bancaire CSV et rapprocher les virements des cotisations ouvertes
+    Affiche le rapport : virements enregistrés et lignes non rapprochées
+    """
+    if request.user.role != 'admin_association':
+        messages.error(request, "Accès non autorisé")
+        return redirect('home')
+
+    association = get_object_or_404(Association, admin_principal=request.user)
+    rapport = None
+
+    if request.method == 'POST':
+        form = ReleveBancaireForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                rapport = importer_releve_bancaire(
+                    association,
+                    form.cleaned_data['fichier'],
+                    enregistre_par=request.user,
+                )
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+            else:
+                messages.success(
+                    request,
+                    f"{rapport['rapprochees']} virement(s) enregistré(s) sur {rapport['lignes']} ligne(s)"
+                )
+    else:
+        form = ReleveBancaireForm()
+
+    context = {
+        'association': association,
+        'form': form,
+        'rapport': rapport,
+    }
+    return render(request, 'paiements/importer_releve.html', context)
+
+
 @login_required
 def generer_recu(request, paiement_id):
-    """Générer un reçu PDF simple"""
-    paiement = get_object_or_404(Paiement, id=paiement_id)
-
-    # Créer le PDF
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # En-tête
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(50, height - 80, "REÇU DE PAIEMENT")
-
-    # Informations association
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 120, f"Association: {paiement.cotisation.logement.association.nom}")
-    p.drawString(50, height - 140, f"Adresse: {paiement.cotisation.logement.association.adresse}")
-
-    # Informations paiement
-    y = height - 200
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y, "DÉTAILS DU PAIEMENT")
-
-    y -= 30
-    p.setFont("Helvetica", 11)
-    infos = [
-        f"Logement: {paiement.cotisation.logement.numero}",
-        f"Période: {paiement.cotisation.periode.strftime('%B %Y')}",
-        f"Montant: {paiement.montant} DA",
-        f"Méthode: {paiement.get_methode_display()}",
-        f"Date de paiement: {paiement.date_paiement.strftime('%d/%m/%Y')}",
-        f"Référence: {paiement.reference or 'N/A'}",
-    ]
-
-    for info in infos:
-        p.drawString(50, y, info)
-        y -= 20
-
-    # Signature
-    y -= 40
-    p.drawString(50, y, f"Reçu généré le {date.today().strftime('%d/%m/%Y')}")
-    p.drawString(50, y - 20, f"Par: {paiement.enregistre_par.get_full_name() or paiement.enregistre_par.username}")
-
-    p.showPage()
-    p.save()
-
-    # Marquer le reçu comme généré
-    paiement.recu_genere = True
-    paiement.save()
-
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="recu_{paiement.id}.pdf"'
+    """Télécharger le reçu PDF - rendu une fois puis servi depuis le cache"""
+    paiement = get_object_or_404(
+        Paiement.objects.select_related(*PAIEMENTS_RECU_RELATIONS),
+        id=paiement_id,
+    )
+
+    response = reponse_recu(request, paiement, f"recu_{paiement.id}.pdf")
+
+    # Marquer le reçu comme généré, sans réécrire tout le paiement à chaque téléchargement
+    if not paiement.recu_genere:
+        Paiement.objects.filter(pk=paiement.pk).update(recu_genere=True)
 
     return response
 
 
+@login_required
+def imprimer_recus(request):
+    """
+    Imprimer en un seul PDF les reçus d'une association pour une période (?periode=AAAA-MM)
+    Une requête, une passe de rendu, une page par reçu
+    """
+    if request.user.role != 'admin_association':
+        messages.error(request, "Accès non autorisé")
+        return redirect('home')
+
+    association = get_object_or_404(Association, admin_principal=request.user)
+
+    try:
+        periode = datetime.strptime(request.GET.get('periode', ''), '%Y-%m').date()
+    except ValueError:
+        messages.error(request, "Période invalide (format attendu : AAAA-MM)")
+        return redirect('paiements:liste')
+
+    paiements = list(
+        Paiement.objects.filter(
+            cotisation__logement__association=association,
+            cotisation__periode__year=periode.year,
+            cotisation__periode__month=periode.month,
+        ).select_related(*PAIEMENTS_RECU_RELATIONS).order_by('cotisation__logement__numero', 'numero_recu')
+    )
+    if not paiements:
+        messages.info(request, "Aucun paiement pour cette période")
+        return redirect('paiements:liste')
+
+    pdf = rendre_recus(paiements)
+
+    Paiement.objects.filter(
+        pk__in=[paiement.pk for paiement in paiements if not paiement.recu_genere]
+    ).update(recu_genere=True)
+
+    return FileResponse(
+        BytesIO(pdf),
+        as_attachment=True,
+        filename=f"recus_{association.id}_{periode:%Y_%m}.pdf",
+        content_type='application/pdf',
+    )
+
+
+def _filtrer_paiements(paiements, params):
+    """Filtres simples communs à la liste et à l'export (statut, mois)"""
+    statut = params.get('statut')
+    mois = params.get('mois')
+
+    if statut:
+        paiements = paiements.filter(cotisation__statut=statut)
+    if mois:
+        paiements = paiements.filter(date_paiement__month=mois)
+
+    return paiements
+
+
 @login_required
 def liste_paiements(request):
     """Liste des paiements avec filtres simples"""
@@ -125,14 +247,7 @@ def liste_paiements(request):
     else:
         paiements = Paiement.objects.none()
 
-    # Filtres simples
-    statut = request.GET.get('statut')
-    mois = request.GET.get('mois')
-
-    if statut:
-        paiements = paiements.filter(cotisation__statut=statut)
-    if mois:
-        paiements = paiements.filter(date_paiement__month=mois)
+    paiements = _filtrer_paiements(paiements, request.GET)
 
     context = {
         'paiements': paiements[:50],  # Limite pour performance
@@ -140,3 +255,36 @@ def liste_paiements(request):
         'sum_montants': sum(p.montant for p in paiements),
     }
     return render(request, 'paiements/liste.html', context)
+
+
+@login_required
+def exporter_paiements_csv(request):
+    """Export CSV en flux des paiements filtrés, lus depuis un curseur (mémoire constante)"""
+    if request.user.role != 'admin_association':
+        messages.error(request, "Accès non autorisé")
+        return redirect('home')
+
+    association = get_object_or_404(Association, admin_principal=request.user)
+    paiements = _filtrer_paiements(
+        Paiement.objects.filter(cotisation__logement__association=association),
+        request.GET
+    ).order_by('-date_paiement', 'numero_recu')
+
+    valeurs = paiements.values_list(
+        'numero_recu',
+        'date_paiement',
+        'cotisation__logement__numero',
+        'cotisation__periode',
+        'montant',
+        'methode',
+        'reference',
+    ).iterator(chunk_size=TAILLE_LOT_EXPORT)
+
+    methodes = dict(Paiement.METHODE_CHOICES)
+
+    def lignes():
+        yield ['N° reçu', 'Date', 'Logement', 'Période', 'Montant', 'Méthode', 'Référence']
+        for numero_recu, date_paiement, logement, periode, montant, methode, reference in valeurs:
+            yield [numero_recu, date_paiement, logement, periode, montant, methodes.get(methode, methode), reference]
+
+    return reponse_csv_streaming(f"paiements_{association.id}_{date.today():%Y-%m-%d}.csv", lignes())
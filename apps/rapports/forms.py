@@ -85,6 +85,7 @@ class FiltresRapportsForm(forms.Form):
         ('genere', 'Généré'),
         ('en_cours', 'En cours'),
         ('erreur', 'Erreur'),
+        ('precalcule', 'Données précalculées'),
     ]
 
     type_rapport = forms.ChoiceField(
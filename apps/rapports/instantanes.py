@@ -0,0 +1,187 @@
+"""
+Instantanés mensuels des données de rapport
+- Agrégats par logement, stockés par association et par mois (InstantaneMensuel)
+- Un rapport de plusieurs mois fusionne les instantanés de ses mois
+- Chaque écriture de cotisation ou de paiement marque son mois périmé
+  (signal cotisations_modifiees) : un rapport ne relit que les cotisations
+  des mois périmés ou jamais calculés, en une requête pour tous ces mois
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.cotisations.models import Cotisation
+from .models import InstantaneMensuel
+
+# Champs écrits lors du recalcul d'un instantané existant
+CHAMPS_INSTANTANE = [
+    'logements',
+    'nombre_cotisations',
+    'total_cotisations',
+    'nombre_paiements',
+    'total_paiements',
+    'date_calcul',
+]
+
+
+def _cotisations_par_mois(association_id, debut_periode, fin_periode):
+    """Cotisations de l'association sur la période, annotées de leur mois"""
+    return Cotisation.objects.filter(
+        logement__association_id=association_id,
+        periode__range=(debut_periode, fin_periode),
+    ).annotate(mois=TruncMonth('periode')).order_by()
+
+
+def marquer_instantanes_perimes(cles):
+    """
+    Marquer périmés les mois touchés par une écriture
+    cles: (association_id, periode, type_cotisation_id), comme les résumés financiers
+    Les mois sans instantané reçoivent une ligne déjà périmée : un calcul commencé
+    avant l'écriture ne peut pas enregistrer ensuite un mois considéré à jour
+    """
+    mois = {(association_id, periode.replace(day=1)) for association_id, periode, _ in cles}
+    if not mois:
+        return
+
+    maintenant = timezone.now()
+    InstantaneMensuel.objects.bulk_create([
+        InstantaneMensuel(
+            association_id=association_id,
+            periode=periode,
+            date_calcul=maintenant,
+            date_invalidation=maintenant,
+        )
+        for association_id, periode in mois
+    ], ignore_conflicts=True)
+
+    par_association = defaultdict(list)
+    for association_id, periode in mois:
+        par_association[association_id].append(periode)
+    InstantaneMensuel.objects.filter(reduce(or_, (
+        Q(association_id=association_id, periode__in=periodes)
+        for association_id, periodes in par_association.items()
+    ))).update(date_invalidation=maintenant)
+
+
+def _calculer_agregats_logements(association_id, mois):
+    """
+    Agrégats par logement des mois donnés, en une seule requête groupée par (mois, logement)
+    Retourne {mois: {logement_id (texte): agrégats}}
+    """
+    agregats = defaultdict(dict)
+    if not mois:
+        return agregats
+
+    lignes = _cotisations_par_mois(
+        association_id, min(mois), max(mois) + relativedelta(day=31)
+    ).filter(mois__in=mois).values('mois', 'logement_id').annotate(
+        montant_du=Sum('montant'),
+        montant_paye=Sum('paiement__montant'),
+        nombre_cotisations=Count('id'),
+        nombre_paiements=Count('paiement'),
+        nombre_retard=Count('id', filter=Q(statut='retard')),
+        prochaine_echeance=Min('date_echeance', filter=~Q(statut='payee')),
+    )
+
+    for ligne in lignes:
+        agregats[ligne['mois']][str(ligne['logement_id'])] = {
+            'montant_du': str(ligne['montant_du'] or Decimal('0')),
+            'montant_paye': str(ligne['montant_paye'] or Decimal('0')),
+            'nombre_cotisations': ligne['nombre_cotisations'],
+            'nombre_paiements': ligne['nombre_paiements'],
+            'nombre_retard': ligne['nombre_retard'],
+            'prochaine_echeance': ligne['prochaine_echeance'].isoformat() if ligne['prochaine_echeance'] else None,
+        }
+
+    return agregats
+
+
+def obtenir_instantanes(association_id, debut_periode, fin_periode):
+    """
+    Instantanés à jour des mois de la période (bornes alignées sur des mois entiers)
+    Une lecture des instantanés ; seuls les mois périmés ou absents sont recalculés
+    (une requête groupée) et enregistrés, mois sans cotisation compris (agrégats vides)
+    """
+    mois_periode = []
+    mois = debut_periode.replace(day=1)
+    while mois <= fin_periode:
+        mois_periode.append(mois)
+        mois += relativedelta(months=1)
+
+    existants = {
+        instantane.periode: instantane
+        for instantane in InstantaneMensuel.objects.filter(
+            association_id=association_id,
+            periode__range=(debut_periode, fin_periode),
+        )
+    }
+    perimes = [
+        mois for mois in mois_periode
+        if mois not in existants or existants[mois].est_perime()
+    ]
+
+    if perimes:
+        # Noté avant la lecture : une écriture concurrente laisse le mois périmé
+        debut_calcul = timezone.now()
+        agregats = _calculer_agregats_logements(association_id, perimes)
+        nouveaux = []
+        modifies = []
+        for mois in perimes:
+            instantane = existants.get(mois) or InstantaneMensuel(association_id=association_id, periode=mois)
+            instantane.logements = agregats.get(mois, {})
+            valeurs = instantane.logements.values()
+            instantane.nombre_cotisations = sum(agregat['nombre_cotisations'] for agregat in valeurs)
+            instantane.total_cotisations = sum((Decimal(agregat['montant_du']) for agregat in valeurs), Decimal('0'))
+            instantane.nombre_paiements = sum(agregat['nombre_paiements'] for agregat in valeurs)
+            instantane.total_paiements = sum((Decimal(agregat['montant_paye']) for agregat in valeurs), Decimal('0'))
+            instantane.date_calcul = debut_calcul
+            existants[mois] = instantane
+            (modifies if instantane.pk else nouveaux).append(instantane)
+
+        if nouveaux:
+            # Mois créé entre-temps (calcul parallèle ou écriture marquée) : il reste à recalculer
+            InstantaneMensuel.objects.bulk_create(nouveaux, ignore_conflicts=True)
+        if modifies:
+            InstantaneMensuel.objects.bulk_update(modifies, CHAMPS_INSTANTANE)
+
+    return [existants[mois] for mois in mois_periode]
+
+
+def fusionner_instantanes(instantanes):
+    """
+    Fusionner les agrégats par logement de plusieurs mois
+    Sommes des montants et compteurs, échéance impayée la plus proche
+    Retourne {logement_id: agrégats}, montants en Decimal
+    """
+    fusion = {}
+    for instantane in instantanes:
+        for logement_id, agregat in instantane.logements.items():
+            cumul = fusion.get(int(logement_id))
+            if cumul is None:
+                fusion[int(logement_id)] = {
+                    'montant_du': Decimal(agregat['montant_du']),
+                    'montant_paye': Decimal(agregat['montant_paye']),
+                    'nombre_cotisations': agregat['nombre_cotisations'],
+                    'nombre_paiements': agregat['nombre_paiements'],
+                    'nombre_retard': agregat['nombre_retard'],
+                    'prochaine_echeance': agregat['prochaine_echeance'],
+                }
+                continue
+
+            cumul['montant_du'] += Decimal(agregat['montant_du'])
+            cumul['montant_paye'] += Decimal(agregat['montant_paye'])
+            cumul['nombre_cotisations'] += agregat['nombre_cotisations']
+            cumul['nombre_paiements'] += agregat['nombre_paiements']
+            cumul['nombre_retard'] += agregat['nombre_retard']
+            echeances = [e for e in (cumul['prochaine_echeance'], agregat['prochaine_echeance']) if e]
+            # Dates ISO : l'ordre alphabétique est l'ordre chronologique
+            cumul['prochaine_echeance'] = min(echeances) if echeances else None
+
+    return fusion
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rapports', '0002_add_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapportmensuel',
+            name='lignes_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Lignes à traiter'),
+        ),
+        migrations.AddField(
+            model_name='rapportmensuel',
+            name='lignes_traitees',
+            field=models.PositiveIntegerField(default=0, verbose_name='Lignes traitées'),
+        ),
+        migrations.AddField(
+            model_name='rapportmensuel',
+            name='message_erreur',
+            field=models.TextField(blank=True, verbose_name="Message d'erreur"),
+        ),
+        migrations.AddField(
+            model_name='rapportmensuel',
+            name='progression',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Progression (%)'),
+        ),
+    ]
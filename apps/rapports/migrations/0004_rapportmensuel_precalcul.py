@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rapports', '0003_rapportmensuel_progression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rapportmensuel',
+            name='date_calcul',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Données calculées le'),
+        ),
+        migrations.AlterField(
+            model_name='rapportmensuel',
+            name='statut',
+            field=models.CharField(choices=[('genere', 'Généré'), ('en_cours', 'En cours'), ('erreur', 'Erreur'), ('precalcule', 'Données précalculées')], default='en_cours', max_length=10, verbose_name='Statut'),
+        ),
+    ]
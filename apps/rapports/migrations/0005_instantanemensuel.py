@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('associations', '0003_remove_logement_unique_logement_association_and_more'),
+        ('rapports', '0004_rapportmensuel_precalcul'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.DateField(verbose_name='Mois (premier jour)')),
+                ('logements', models.JSONField(default=dict, verbose_name='Agrégats par logement')),
+                ('nombre_cotisations', models.PositiveIntegerField(default=0, verbose_name='Nombre de cotisations')),
+                ('total_cotisations', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des cotisations (DA)')),
+                ('nombre_paiements', models.PositiveIntegerField(default=0, verbose_name='Nombre de paiements')),
+                ('total_paiements', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des paiements (DA)')),
+                ('derniere_modification', models.DateTimeField(blank=True, null=True, verbose_name='Dernière modification des cotisations')),
+                ('date_calcul', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+                ('association', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes_rapports', to='associations.association', verbose_name='Association')),
+            ],
+            options={
+                'verbose_name': 'Instantané mensuel',
+                'verbose_name_plural': 'Instantanés mensuels',
+                'db_table': 'iltizem_instantanes_rapports',
+                'ordering': ['association', 'periode'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='instantanemensuel',
+            constraint=models.UniqueConstraint(fields=('association', 'periode'), name='unique_instantane_periode'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def invalider_instantanes_existants(apps, schema_editor):
+    """Instantanés validés jusqu'ici par empreinte : recalculés au prochain rapport"""
+    InstantaneMensuel = apps.get_model('rapports', 'InstantaneMensuel')
+    InstantaneMensuel.objects.update(date_invalidation=django.utils.timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rapports', '0005_instantanemensuel'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='instantanemensuel',
+            name='derniere_modification',
+        ),
+        migrations.AddField(
+            model_name='instantanemensuel',
+            name='date_invalidation',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Invalidé le'),
+        ),
+        migrations.AlterField(
+            model_name='instantanemensuel',
+            name='date_calcul',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Calculé le'),
+        ),
+        migrations.RunPython(invalider_instantanes_existants, migrations.RunPython.noop),
+    ]
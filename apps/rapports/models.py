@@ -1,10 +1,15 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.files.storage import default_storage
+from django.utils import timezone
+from datetime import timedelta
 import json
 
 User = get_user_model()
 
+# Au-delà, un rapport resté en_cours est considéré abandonné (worker arrêté) et peut être relancé
+DELAI_MAX_GENERATION = timedelta(minutes=30)
+
 
 class RapportMensuel(models.Model):
     """Rapports générés pour les associations"""
@@ -26,6 +31,7 @@ class RapportMensuel(models.Model):
         ('genere', 'Généré'),
         ('en_cours', 'En cours'),
         ('erreur', 'Erreur'),
+        ('precalcule', 'Données précalculées'),
     ]
 
     # Informations de base
@@ -39,6 +45,8 @@ class RapportMensuel(models.Model):
     # Fichier et données
     fichier = models.FileField(upload_to='rapports/%Y/%m/', blank=True, verbose_name='Fichier généré')
     donnees_json = models.JSONField(null=True, blank=True, verbose_name='Données JSON')
+    # Début du calcul de donnees_json, comparé à InstantaneMensuel.date_invalidation
+    date_calcul = models.DateTimeField(null=True, blank=True, verbose_name='Données calculées le')
 
     # Métadonnées
     statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='en_cours', verbose_name='Statut')
@@ -46,6 +54,12 @@ class RapportMensuel(models.Model):
     taille_fichier = models.PositiveIntegerField(null=True, blank=True, verbose_name='Taille (octets)')
     genere_par = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Généré par')
 
+    # Suivi de la génération en tâche de fond
+    lignes_traitees = models.PositiveIntegerField(default=0, verbose_name='Lignes traitées')
+    lignes_total = models.PositiveIntegerField(default=0, verbose_name='Lignes à traiter')
+    progression = models.PositiveSmallIntegerField(default=0, verbose_name='Progression (%)')
+    message_erreur = models.TextField(blank=True, verbose_name="Message d'erreur")
+
     class Meta:
         verbose_name = 'Rapport'
         verbose_name_plural = 'Rapports'
@@ -72,6 +86,53 @@ class RapportMensuel(models.Model):
         self.donnees_json = data
         self.save()
 
+    def donnees_precalculees_valides(self):
+        """
+        Données JSON réutilisables telles quelles : aucun mois de la période n'a
+        été invalidé (écriture de cotisation ou de paiement) depuis leur calcul
+        """
+        if self.donnees_json is None or self.date_calcul is None:
+            return False
+
+        from .utils import bornes_periode_rapport
+        debut_periode, fin_periode = bornes_periode_rapport(self)
+        return not InstantaneMensuel.objects.filter(
+            association_id=self.association_id,
+            periode__range=(debut_periode.replace(day=1), fin_periode),
+            date_invalidation__gte=self.date_calcul,
+        ).exists()
+
+    def generation_abandonnee(self):
+        """Rapport en_cours lancé depuis plus de DELAI_MAX_GENERATION"""
+        return self.statut == 'en_cours' and self.date_generation < timezone.now() - DELAI_MAX_GENERATION
+
+    def mettre_a_jour_progression(self, lignes_traitees, lignes_total):
+        """
+        Enregistrer l'avancement de la génération (UPDATE ciblé, sans save complet)
+        Lu par la liste des rapports et l'endpoint de statut
+        """
+        self.lignes_traitees = lignes_traitees
+        self.lignes_total = lignes_total
+        self.progression = min(100, lignes_traitees * 100 // lignes_total) if lignes_total else 0
+        RapportMensuel.objects.filter(pk=self.pk).update(
+            lignes_traitees=self.lignes_traitees,
+            lignes_total=self.lignes_total,
+            progression=self.progression,
+        )
+
+    def get_statut_dict(self):
+        """État de la génération, pour l'endpoint JSON de suivi"""
+        return {
+            'id': self.id,
+            'statut': self.statut,
+            'statut_display': self.get_statut_display(),
+            'progression': self.progression,
+            'lignes_traitees': self.lignes_traitees,
+            'lignes_total': self.lignes_total,
+            'erreur': self.message_erreur,
+            'taille': self.get_taille_lisible(),
+        }
+
     def get_taille_lisible(self):
         """Taille du fichier en format lisible"""
         if not self.taille_fichier:
@@ -83,3 +144,52 @@ class RapportMensuel(models.Model):
             return f"{self.taille_fichier / 1024:.1f} KB"
         else:
             return f"{self.taille_fichier / (1024 * 1024):.1f} MB"
+
+
+class InstantaneMensuel(models.Model):
+    """
+    Agrégats par logement d'un mois de cotisations, réutilisés par tous les rapports
+    Un rapport trimestriel ou annuel fusionne les instantanés de ses mois ; chaque écriture
+    de cotisation ou de paiement marque son mois périmé (date_invalidation), seuls
+    les mois périmés sont recalculés
+    """
+
+    association = models.ForeignKey('associations.Association', on_delete=models.CASCADE,
+                                    related_name='instantanes_rapports', verbose_name='Association')
+    periode = models.DateField(verbose_name='Mois (premier jour)')
+
+    # {logement_id: {montant_du, montant_paye, nombre_cotisations, nombre_paiements,
+    #  nombre_retard, prochaine_echeance}} ; montants en texte (Decimal exact)
+    logements = models.JSONField(default=dict, verbose_name='Agrégats par logement')
+
+    # Totaux du mois, sommes des agrégats par logement
+    nombre_cotisations = models.PositiveIntegerField(default=0, verbose_name='Nombre de cotisations')
+    total_cotisations = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                            verbose_name='Total des cotisations (DA)')
+    nombre_paiements = models.PositiveIntegerField(default=0, verbose_name='Nombre de paiements')
+    total_paiements = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                          verbose_name='Total des paiements (DA)')
+
+    # Début du dernier calcul (avant la lecture des cotisations) et dernière écriture
+    # signalée sur le mois : périmé tant que date_invalidation >= date_calcul
+    date_calcul = models.DateTimeField(default=timezone.now, verbose_name='Calculé le')
+    date_invalidation = models.DateTimeField(null=True, blank=True, verbose_name='Invalidé le')
+
+    class Meta:
+        verbose_name = 'Instantané mensuel'
+        verbose_name_plural = 'Instantanés mensuels'
+        db_table = 'iltizem_instantanes_rapports'
+        ordering = ['association', 'periode']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['association', 'periode'],
+                name='unique_instantane_periode'
+            )
+        ]
+
+    def __str__(self):
+        return f"Instantané {self.association_id} - {self.periode.strftime('%m/%Y')}"
+
+    def est_perime(self):
+        """Une écriture a été signalée sur le mois depuis le début du dernier calcul"""
+        return self.date_invalidation is not None and self.date_invalidation >= self.date_calcul
@@ -0,0 +1,15 @@
+"""
+Signaux des rapports
+- Instantanés mensuels marqués périmés après chaque écriture de cotisations ou de paiements
+  (unitaire ou en masse, voir cotisations_modifiees)
+"""
+
+from django.dispatch import receiver
+
+from apps.cotisations.resumes import cotisations_modifiees
+from .instantanes import marquer_instantanes_perimes
+
+
+@receiver(cotisations_modifiees)
+def invalider_instantanes(sender, cles, **kwargs):
+    marquer_instantanes_perimes(cles)
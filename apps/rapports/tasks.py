@@ -0,0 +1,178 @@
+"""
+Tâches Celery des rapports
+- Génération des fichiers PDF / Excel / CSV en tâche de fond
+- Précalcul nocturne des rapports mensuels, réparti sur les workers
+"""
+
+import logging
+import os
+from celery import shared_task, chord
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from apps.associations.models import Association
+from .models import RapportMensuel
+from .utils import collecter_donnees_rapport, generer_rapport_pdf, generer_rapport_excel, generer_rapport_csv
+
+logger = logging.getLogger('iltizem')
+
+GENERATEURS_RAPPORT = {
+    'pdf': generer_rapport_pdf,
+    'excel': generer_rapport_excel,
+    'csv': generer_rapport_csv,
+}
+
+# Nombre d'associations précalculées par sous-tâche
+TAILLE_SHARD_PRECALCUL = 10
+
+# Débit maximal de sous-tâches de précalcul par worker (la base reste disponible la nuit)
+LIMITE_PRECALCUL_SHARDS = '6/m'
+
+
+@shared_task(acks_late=True)
+def generer_rapport_fichier(rapport_id, options=None):
+    """
+    Générer le fichier d'un RapportMensuel créé par la vue (statut en_cours)
+    Les données précalculées laissées par la vue sont réutilisées sans requête
+    La progression est enregistrée au fil de l'écriture ; le statut passe
+    à genere ou erreur à la fin
+    """
+    try:
+        rapport = RapportMensuel.objects.select_related('association').get(pk=rapport_id)
+    except RapportMensuel.DoesNotExist:
+        # Rapport supprimé avant le démarrage de la tâche
+        return f"Rapport {rapport_id} introuvable"
+
+    if rapport.statut != 'en_cours':
+        return f"Rapport {rapport_id} déjà traité ({rapport.statut})"
+
+    try:
+        generateur = GENERATEURS_RAPPORT[rapport.format_fichier]
+        # Données agrégées une seule fois, partagées par le générateur et donnees_json
+        if rapport.donnees_json is None:
+            # Début du calcul : une écriture pendant la lecture rend les données périmées
+            rapport.date_calcul = timezone.now()
+            rapport.donnees_json = collecter_donnees_rapport(rapport)
+        fichier_path = generateur(
+            rapport, rapport.donnees_json, options or {}, progression=rapport.mettre_a_jour_progression
+        )
+    except Exception as e:
+        logger.exception("Erreur génération rapport %s", rapport_id)
+        RapportMensuel.objects.filter(pk=rapport_id).update(statut='erreur', message_erreur=str(e))
+        return f"Rapport {rapport_id} en erreur: {e}"
+
+    # Chemin relatif à MEDIA_ROOT, comme un upload classique
+    rapport.fichier.name = os.path.relpath(fichier_path, settings.MEDIA_ROOT)
+    rapport.taille_fichier = os.path.getsize(fichier_path)
+    rapport.statut = 'genere'
+    rapport.progression = 100
+    rapport.message_erreur = ''
+    rapport.save(update_fields=[
+        'fichier', 'taille_fichier', 'donnees_json', 'date_calcul', 'statut', 'progression', 'message_erreur'
+    ])
+
+    return f"Rapport {rapport_id} généré ({rapport.get_taille_lisible()})"
+
+
+@shared_task
+def precalculer_rapports_mensuels():
+    """
+    Précalculer les rapports mensuels du mois écoulé pour les associations actives
+    Répartit les associations en lots (chord) au débit LIMITE_PRECALCUL_SHARDS ;
+    les demandes du lendemain réutilisent donnees_json au lieu d'interroger la base
+    Aucun fichier n'est produit : il est généré à la demande, au format et avec
+    les options choisis par l'utilisateur
+    """
+    # Premier jour du mois écoulé, figé ici pour que les relances visent la même période
+    periode = (date.today() - relativedelta(months=1)).replace(day=1)
+
+    association_ids = list(
+        Association.objects.filter(actif=True).order_by('id').values_list('id', flat=True)
+    )
+    shards = [
+        association_ids[i:i + TAILLE_SHARD_PRECALCUL]
+        for i in range(0, len(association_ids), TAILLE_SHARD_PRECALCUL)
+    ]
+
+    if not shards:
+        return "Rapports précalculés: 0"
+
+    chord(
+        precalculer_rapports_shard.s(shard, periode.isoformat())
+        for shard in shards
+    )(resumer_precalcul_rapports.s(periode.isoformat()))
+
+    return f"Précalcul lancé: {len(association_ids)} associations en {len(shards)} lots"
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=3,
+    acks_late=True,
+    rate_limit=LIMITE_PRECALCUL_SHARDS,
+)
+def precalculer_rapports_shard(association_ids, periode_iso):
+    """
+    Précalculer les données du rapport mensuel d'un lot d'associations
+    Les rapports déjà générés ou en cours ne sont pas touchés ; les autres
+    (précalculés la veille, en erreur) sont recalculés et restent 'precalcule'
+    Retourne les compteurs {precalcules, ignores, erreurs}
+    """
+    periode = date.fromisoformat(periode_iso)
+    compteurs = {'precalcules': 0, 'ignores': 0, 'erreurs': 0}
+
+    for association in Association.objects.filter(id__in=association_ids, actif=True):
+        rapport, _ = RapportMensuel.objects.get_or_create(
+            association=association,
+            periode=periode,
+            type_rapport='mensuel',
+            defaults={
+                'statut': 'precalcule',
+                'format_fichier': 'pdf',
+                'genere_par_id': association.admin_principal_id,
+            }
+        )
+        if rapport.statut in ('genere', 'en_cours'):
+            compteurs['ignores'] += 1
+            continue
+        rapport.association = association
+
+        try:
+            champs = {
+                'date_calcul': timezone.now(),
+                'donnees_json': collecter_donnees_rapport(rapport),
+                'statut': 'precalcule',
+                'message_erreur': '',
+            }
+        except DatabaseError:
+            raise
+        except Exception:
+            logger.exception("Erreur précalcul rapport %s (association %s)", periode_iso, association.id)
+            compteurs['erreurs'] += 1
+            continue
+
+        # Ne pas écraser une génération demandée entre-temps depuis la vue
+        RapportMensuel.objects.filter(pk=rapport.pk, statut__in=['precalcule', 'erreur']).update(**champs)
+        compteurs['precalcules'] += 1
+
+    return compteurs
+
+
+@shared_task
+def resumer_precalcul_rapports(resultats_shards, periode_iso):
+    """Agréger les compteurs renvoyés par les lots de précalcul"""
+    totaux = {'precalcules': 0, 'ignores': 0, 'erreurs': 0}
+    for resultat in resultats_shards:
+        for cle, valeur in (resultat or {}).items():
+            totaux[cle] = totaux.get(cle, 0) + valeur
+
+    logger.info(
+        "Précalcul des rapports %s: %s précalculés, %s ignorés, %s en erreur",
+        periode_iso, totaux['precalcules'], totaux['ignores'], totaux['erreurs']
+    )
+
+    return f"Rapports précalculés: {totaux['precalcules']}"
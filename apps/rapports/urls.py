@@ -7,6 +7,8 @@ urlpatterns = [
     path('', views.liste_rapports, name='liste'),
     path('generer/', views.generer_rapport, name='generer'),
     path('telecharger/<int:rapport_id>/', views.telecharger_rapport, name='telecharger'),
+    path('statut/<int:rapport_id>/', views.statut_rapport, name='statut'),
+    path('exporter/<int:rapport_id>/csv/', views.exporter_rapport_csv, name='exporter_csv'),
     path('details/<int:rapport_id>/', views.details_rapport, name='details'),
     path('supprimer/<int:rapport_id>/', views.supprimer_rapport, name='supprimer'),
     path('statistiques/', views.statistiques_rapports, name='statistiques'),
@@ -3,23 +3,125 @@ Utilitaires pour la génération de rapports
 """
 
 from django.conf import settings
-from django.db.models import Sum, Count, Q
-from reportlab.pdfgen import canvas
+from django.db.models import Sum, Count, Min, Q
+from django.http import FileResponse, HttpResponse
+from django.utils.encoding import iri_to_uri
+from django.utils.http import content_disposition_header
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import LongTable, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xml.sax.saxutils import escape
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 import csv
 import os
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 
-from apps.cotisations.models import Cotisation
-from apps.paiements.models import Paiement
-
+from iltizem.exports import TAILLE_LOT_EXPORT
+from apps.associations.models import Logement
+from apps.cotisations.models import Cotisation, ResumeFinancier
+from apps.cotisations.resumes import totaux_resumes
+from .instantanes import fusionner_instantanes, obtenir_instantanes
+
+# Nombre de lignes de détail entre deux mises à jour de la progression
+PAS_PROGRESSION = 200
+
+# Mise en page du rapport PDF
+MARGE_PDF = 40
+# Le découpage d'un tableau platypus recopie les lignes restantes à chaque page :
+# au-delà de ce nombre de lignes, le détail est réparti sur plusieurs tableaux successifs
+LIGNES_PAR_TABLEAU_PDF = 1000
+LONGUEUR_MAX_RESIDENT_PDF = 38
+ENTETES_DETAILS_PDF = ['Logement', 'Résident', 'Statut', 'Montant', 'Échéance']
+LARGEURS_DETAILS_PDF = [70, 200, 70, 95, 80]
+
+STYLES_PDF = getSampleStyleSheet()
+STYLE_TABLE_RESUME_PDF = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+])
+STYLE_TABLE_DETAILS_PDF = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+# Formats du classeur Excel
+FORMAT_MONTANT_EXCEL = '#,##0.00 "DA"'
+POLICE_GRAS_EXCEL = Font(bold=True)
+
+
+def _signaler_progression(progression, lignes_traitees, lignes_total):
+    """Appeler progression(traitees, total) toutes les PAS_PROGRESSION lignes et à la fin"""
+    if progression and (lignes_traitees % PAS_PROGRESSION == 0 or lignes_traitees == lignes_total):
+        progression(lignes_traitees, lignes_total)
+
+
+def _histoire_rapport_pdf(rapport, donnees, options):
+    """Flowables du rapport PDF : en-tête, résumé et, en option, le détail par logement"""
+    histoire = [
+        Paragraph(f"Rapport {rapport.get_type_rapport_display()}", STYLES_PDF['Title']),
+        Paragraph(f"Association: {escape(rapport.association.nom)}", STYLES_PDF['Normal']),
+        Paragraph(f"Période: {rapport.periode.strftime('%B %Y')}", STYLES_PDF['Normal']),
+        Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}", STYLES_PDF['Normal']),
+        Spacer(1, 20),
+    ]
 
-def generer_rapport_pdf(rapport, options=None):
-    """Générer un rapport PDF"""
+    # Données principales
+    histoire.append(Paragraph("Résumé Financier", STYLES_PDF['Heading2']))
+    histoire.append(Table([
+        ['Total collecté', f"{donnees['total_collecte']:,.2f} DA"],
+        ['Total attendu', f"{donnees['total_attendu']:,.2f} DA"],
+        ['Taux de recouvrement', f"{donnees['taux_recouvrement']:.1f}%"],
+        ['Nombre de paiements', donnees['nombre_paiements']],
+        ['Cotisations en retard', donnees['cotisations_retard']],
+    ], colWidths=[200, 150], hAlign='LEFT', style=STYLE_TABLE_RESUME_PDF))
+
+    if not options.get('inclure_details', False):
+        return histoire
+
+    # Détails par logement : tableaux découpés par platypus d'une page à l'autre,
+    # en-tête répété
+    details = donnees['details_logements']
+    histoire.append(PageBreak())
+    histoire.append(Paragraph("Détails par Logement", STYLES_PDF['Heading2']))
+
+    for debut in range(0, len(details), LIGNES_PAR_TABLEAU_PDF):
+        bloc = details[debut:debut + LIGNES_PAR_TABLEAU_PDF]
+        histoire.append(LongTable(
+            [ENTETES_DETAILS_PDF] + [
+                [
+                    detail['logement'],
+                    detail['resident'][:LONGUEUR_MAX_RESIDENT_PDF],
+                    detail['statut'],
+                    f"{detail['montant']:,.2f} DA",
+                    detail['echeance'],
+                ]
+                for detail in bloc
+            ],
+            colWidths=LARGEURS_DETAILS_PDF,
+            repeatRows=1,
+            style=STYLE_TABLE_DETAILS_PDF,
+        ))
+    return histoire
+
+
+def generer_rapport_pdf(rapport, donnees, options=None, progression=None):
+    """
+    Générer un rapport PDF (platypus) : résumé puis détail complet par logement,
+    sauts de page automatiques et en-têtes de tableau répétés
+    donnees: résultat de collecter_donnees_rapport, calculé une fois pour tous les formats
+    progression: fonction (lignes traitées, lignes total) appelée pendant l'écriture
+    """
     if options is None:
         options = {}
 
@@ -32,67 +134,62 @@ def generer_rapport_pdf(rapport, options=None):
     nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.id}_{rapport.periode.strftime('%Y-%m')}.pdf"
     fichier_path = os.path.join(rapport_dir, nom_fichier)
 
-    # Collecter les données
-    donnees = _collecter_donnees_rapport(rapport)
-    rapport.set_donnees(donnees)
-
-    # Créer le PDF
-    c = canvas.Canvas(fichier_path, pagesize=A4)
-    width, height = A4
-
-    # En-tête
-    c.setFont("Helvetica-Bold", 20)
-    c.drawString(50, height - 80, f"Rapport {rapport.get_type_rapport_display()}")
-
-    c.setFont("Helvetica", 14)
-    c.drawString(50, height - 110, f"Association: {rapport.association.nom}")
-    c.drawString(50, height - 130, f"Période: {rapport.periode.strftime('%B %Y')}")
-    c.drawString(50, height - 150, f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}")
-
-    # Données principales
-    y = height - 200
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, y, "Résumé Financier")
-
-    y -= 30
-    c.setFont("Helvetica", 12)
-
-    resume_items = [
-        f"Total collecté: {donnees['total_collecte']} DA",
-        f"Total attendu: {donnees['total_attendu']} DA",
-        f"Taux de recouvrement: {donnees['taux_recouvrement']:.1f}%",
-        f"Nombre de paiements: {donnees['nombre_paiements']}",
-        f"Cotisations en retard: {donnees['cotisations_retard']}",
-    ]
-
-    for item in resume_items:
-        c.drawString(50, y, item)
-        y -= 20
-
-    # Détails par logement si demandé
-    if options.get('inclure_details', False):
-        y -= 30
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(50, y, "Détails par Logement")
-        y -= 20
-
-        c.setFont("Helvetica", 10)
-        for detail in donnees['details_logements'][:20]:  # Limiter à 20 pour ne pas déborder
-            c.drawString(50, y,
-                         f"{detail['logement']} - {detail['resident']} - {detail['statut']} - {detail['montant']} DA")
-            y -= 15
+    document = SimpleDocTemplate(
+        fichier_path,
+        pagesize=A4,
+        leftMargin=MARGE_PDF,
+        rightMargin=MARGE_PDF,
+        topMargin=MARGE_PDF,
+        bottomMargin=MARGE_PDF,
+        title=f"Rapport {rapport.get_type_rapport_display()} - {rapport.association.nom}",
+    )
+
+    def pied_de_page(canvas, document):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(MARGE_PDF, MARGE_PDF / 2, rapport.association.nom)
+        canvas.drawRightString(A4[0] - MARGE_PDF, MARGE_PDF / 2, f"Page {document.page}")
+        canvas.restoreState()
+
+    lignes_total = len(donnees['details_logements']) if options.get('inclure_details', False) else 0
+    lignes_traitees = 0
+
+    def apres_flowable(flowable):
+        # Chaque morceau de tableau de détail dessiné (une page) : lignes hors en-tête répété
+        nonlocal lignes_traitees
+        if isinstance(flowable, LongTable):
+            avant = lignes_traitees
+            lignes_traitees += flowable._nrows - 1
+            if progression and (lignes_traitees // PAS_PROGRESSION > avant // PAS_PROGRESSION
+                                or lignes_traitees == lignes_total):
+                progression(lignes_traitees, lignes_total)
+
+    document.afterFlowable = apres_flowable
+    document.build(
+        _histoire_rapport_pdf(rapport, donnees, options),
+        onFirstPage=pied_de_page,
+        onLaterPages=pied_de_page,
+    )
 
-            if y < 50:  # Nouvelle page si nécessaire
-                c.showPage()
-                y = height - 50
+    return fichier_path
 
-    c.save()
 
-    return fichier_path
+def _cellule_excel(feuille, valeur, format_nombre=None, gras=False):
+    """Cellule d'un classeur en écriture seule, avec format numérique ou police grasse"""
+    cellule = WriteOnlyCell(feuille, value=valeur)
+    if format_nombre:
+        cellule.number_format = format_nombre
+    if gras:
+        cellule.font = POLICE_GRAS_EXCEL
+    return cellule
 
 
-def generer_rapport_excel(rapport, options=None):
-    """Générer un rapport Excel"""
+def generer_rapport_excel(rapport, donnees, options=None, progression=None):
+    """
+    Générer un rapport Excel
+    donnees: résultat de collecter_donnees_rapport, calculé une fois pour tous les formats
+    progression: fonction (lignes traitées, lignes total) appelée pendant l'écriture
+    """
     if options is None:
         options = {}
 
@@ -105,64 +202,65 @@ def generer_rapport_excel(rapport, options=None):
     nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.id}_{rapport.periode.strftime('%Y-%m')}.xlsx"
     fichier_path = os.path.join(rapport_dir, nom_fichier)
 
-    # Collecter les données
-    donnees = _collecter_donnees_rapport(rapport)
-    rapport.set_donnees(donnees)
+    # Classeur en écriture seule : les lignes sont sérialisées à l'ajout,
+    # aucune cellule n'est conservée en mémoire
+    workbook = openpyxl.Workbook(write_only=True)
 
-    # Créer le classeur Excel
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Résumé"
+    resume_sheet = workbook.create_sheet(title="Résumé")
+    resume_sheet.column_dimensions['A'].width = 28
+    resume_sheet.column_dimensions['B'].width = 20
 
     # En-tête
-    worksheet['A1'] = f"Rapport {rapport.get_type_rapport_display()}"
-    worksheet['A2'] = f"Association: {rapport.association.nom}"
-    worksheet['A3'] = f"Période: {rapport.periode.strftime('%B %Y')}"
-    worksheet['A4'] = f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}"
-
-    # Données principales
-    row = 6
-    worksheet[f'A{row}'] = "Résumé Financier"
-    row += 2
-
-    resume_data = [
-        ['Total collecté', f"{donnees['total_collecte']} DA"],
-        ['Total attendu', f"{donnees['total_attendu']} DA"],
-        ['Taux de recouvrement', f"{donnees['taux_recouvrement']:.1f}%"],
-        ['Nombre de paiements', donnees['nombre_paiements']],
-        ['Cotisations en retard', donnees['cotisations_retard']],
-    ]
-
-    for item in resume_data:
-        worksheet[f'A{row}'] = item[0]
-        worksheet[f'B{row}'] = item[1]
-        row += 1
+    resume_sheet.append([_cellule_excel(resume_sheet, f"Rapport {rapport.get_type_rapport_display()}", gras=True)])
+    resume_sheet.append([f"Association: {rapport.association.nom}"])
+    resume_sheet.append([f"Période: {rapport.periode.strftime('%B %Y')}"])
+    resume_sheet.append([f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}"])
+    resume_sheet.append([])
+
+    # Données principales (valeurs numériques, formatées par Excel)
+    resume_sheet.append([_cellule_excel(resume_sheet, "Résumé Financier", gras=True)])
+    resume_sheet.append([])
+    resume_sheet.append(['Total collecté', _cellule_excel(resume_sheet, donnees['total_collecte'], FORMAT_MONTANT_EXCEL)])
+    resume_sheet.append(['Total attendu', _cellule_excel(resume_sheet, donnees['total_attendu'], FORMAT_MONTANT_EXCEL)])
+    resume_sheet.append(['Taux de recouvrement', _cellule_excel(resume_sheet, donnees['taux_recouvrement'] / 100, '0.0%')])
+    resume_sheet.append(['Nombre de paiements', donnees['nombre_paiements']])
+    resume_sheet.append(['Cotisations en retard', donnees['cotisations_retard']])
 
     # Détails par logement si demandé
     if options.get('inclure_details', False):
-        # Créer une nouvelle feuille
         details_sheet = workbook.create_sheet(title="Détails Logements")
+        for colonne, largeur in zip('ABCDE', [14, 30, 10, 16, 14]):
+            details_sheet.column_dimensions[colonne].width = largeur
+        details_sheet.freeze_panes = 'A2'
 
         # En-têtes
-        headers = ['Logement', 'Résident', 'Statut', 'Montant', 'Date Échéance']
-        for col, header in enumerate(headers, 1):
-            details_sheet.cell(row=1, column=col, value=header)
-
-        # Données
-        for row, detail in enumerate(donnees['details_logements'], 2):
-            details_sheet.cell(row=row, column=1, value=detail['logement'])
-            details_sheet.cell(row=row, column=2, value=detail['resident'])
-            details_sheet.cell(row=row, column=3, value=detail['statut'])
-            details_sheet.cell(row=row, column=4, value=detail['montant'])
-            details_sheet.cell(row=row, column=5, value=detail['echeance'])
+        headers = ['Logement', 'Résident', 'Statut', 'Montant (DA)', 'Date Échéance']
+        details_sheet.append([_cellule_excel(details_sheet, header, gras=True) for header in headers])
+
+        # Données : valeurs brutes (une cellule stylée par ligne coûte ~25% de CPU),
+        # chaque ligne est écrite puis oubliée
+        total = len(donnees['details_logements'])
+        for index, detail in enumerate(donnees['details_logements'], 1):
+            details_sheet.append([
+                detail['logement'],
+                detail['resident'],
+                detail['statut'],
+                detail['montant'],
+                date.fromisoformat(detail['echeance']) if detail['echeance'] else None,
+            ])
+            _signaler_progression(progression, index, total)
 
     workbook.save(fichier_path)
 
     return fichier_path
 
 
-def generer_rapport_csv(rapport, options=None):
-    """Générer un rapport CSV"""
+def generer_rapport_csv(rapport, donnees, options=None, progression=None):
+    """
+    Générer un rapport CSV
+    donnees: résultat de collecter_donnees_rapport, calculé une fois pour tous les formats
+    progression: fonction (lignes traitées, lignes total) appelée pendant l'écriture
+    """
     if options is None:
         options = {}
 
@@ -175,10 +273,6 @@ def generer_rapport_csv(rapport, options=None):
     nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.id}_{rapport.periode.strftime('%Y-%m')}.csv"
     fichier_path = os.path.join(rapport_dir, nom_fichier)
 
-    # Collecter les données
-    donnees = _collecter_donnees_rapport(rapport)
-    rapport.set_donnees(donnees)
-
     # Créer le CSV
     with open(fichier_path, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
@@ -204,7 +298,8 @@ def generer_rapport_csv(rapport, options=None):
             writer.writerow(['Détails par Logement'])
             writer.writerow(['Logement', 'Résident', 'Statut', 'Montant', 'Date Échéance'])
 
-            for detail in donnees['details_logements']:
+            total = len(donnees['details_logements'])
+            for index, detail in enumerate(donnees['details_logements'], 1):
                 writer.writerow([
                     detail['logement'],
                     detail['resident'],
@@ -212,19 +307,242 @@ def generer_rapport_csv(rapport, options=None):
                     detail['montant'],
                     detail['echeance']
                 ])
+                _signaler_progression(progression, index, total)
 
     return fichier_path
 
 
-def _collecter_donnees_rapport(rapport):
-    """Collecter les données pour le rapport"""
-    association = rapport.association
+def bornes_periode_rapport(rapport):
+    """(premier jour, dernier jour) couverts par le rapport selon son type"""
     periode = rapport.periode
 
-    # Déterminer la période selon le type de rapport
-    if rapport.type_rapport == 'mensuel':
-        debut_periode = periode.replace(day=1)
-        fin_periode = (debut_periode + relativedelta(months=1)) - relativedelta(days=1)
-    elif rapport.type_rapport == 'trimestriel':
+    if rapport.type_rapport == 'trimestriel':
         # Premier jour du trimestre
         debut_periode = periode.replace(day=1, month=((periode.month - 1) // 3) * 3 + 1)
+        fin_periode = debut_periode + relativedelta(months=3, days=-1)
+    elif rapport.type_rapport == 'annuel':
+        debut_periode = periode.replace(day=1, month=1)
+        fin_periode = periode.replace(day=31, month=12)
+    elif rapport.type_rapport == 'personnalise':
+        # Depuis la période choisie jusqu'à la fin du mois de génération
+        debut_periode = periode
+        fin_periode = date.today() + relativedelta(day=31)
+    else:
+        debut_periode = periode.replace(day=1)
+        fin_periode = debut_periode + relativedelta(months=1, days=-1)
+
+    return debut_periode, fin_periode
+
+
+def _cotisations_rapport(rapport):
+    """Cotisations de l'association sur la période couverte par le rapport"""
+    debut_periode, fin_periode = bornes_periode_rapport(rapport)
+    return Cotisation.objects.filter(
+        logement__association_id=rapport.association_id,
+        periode__range=(debut_periode, fin_periode),
+    )
+
+
+def requete_details_logements(rapport):
+    """
+    Agrégation conditionnelle par logement (montant dû, payé, nombre de paiements,
+    cotisations en retard, prochaine échéance impayée), en lignes values()
+    """
+    return _cotisations_rapport(rapport).values(
+        'logement_id',
+        'logement__numero',
+        'logement__resident__first_name',
+        'logement__resident__last_name',
+        'logement__resident__username',
+    ).annotate(
+        montant_du=Sum('montant'),
+        montant_paye=Sum('paiement__montant'),
+        nombre_cotisations=Count('id'),
+        nombre_paiements=Count('paiement'),
+        nombre_retard=Count('id', filter=Q(statut='retard')),
+        prochaine_echeance=Min('date_echeance', filter=~Q(statut='payee')),
+    ).order_by('logement__numero')
+
+
+def formater_detail_logement(ligne):
+    """Ligne de requete_details_logements -> détail affiché dans les rapports (JSON)"""
+    if ligne['nombre_retard']:
+        statut = 'retard'
+    elif ligne['nombre_paiements'] >= ligne['nombre_cotisations']:
+        statut = 'payee'
+    else:
+        statut = 'due'
+
+    resident = ' '.join(filter(None, [
+        ligne['logement__resident__first_name'],
+        ligne['logement__resident__last_name'],
+    ])) or ligne['logement__resident__username'] or 'Non assigné'
+
+    return {
+        'logement': ligne['logement__numero'],
+        'resident': resident,
+        'statut': statut,
+        'montant': float(ligne['montant_du'] or 0),
+        'montant_paye': float(ligne['montant_paye'] or 0),
+        'cotisations': ligne['nombre_cotisations'],
+        'echeance': ligne['prochaine_echeance'].isoformat() if ligne['prochaine_echeance'] else '',
+    }
+
+
+def _resume_financier(total_collecte, total_attendu, nombre_paiements, cotisations_retard):
+    return {
+        'total_collecte': float(total_collecte),
+        'total_attendu': float(total_attendu),
+        'taux_recouvrement': float(total_collecte / total_attendu * 100) if total_attendu else 0.0,
+        'nombre_paiements': nombre_paiements,
+        'cotisations_retard': cotisations_retard,
+    }
+
+
+def calculer_resume_financier(rapport):
+    """
+    Résumé financier seul (sans le détail par logement), lu dans les résumés
+    matérialisés (ResumeFinancier) de la période : quelques lignes par mois
+    """
+    debut_periode, fin_periode = bornes_periode_rapport(rapport)
+    totaux = totaux_resumes(ResumeFinancier.objects.filter(
+        association_id=rapport.association_id,
+        periode__range=(debut_periode, fin_periode),
+    ))
+    return _resume_financier(
+        Decimal(totaux['total_collecte']),
+        Decimal(totaux['total_attendu']),
+        totaux['nombre_paiements'],
+        totaux['nombre_retard'],
+    )
+
+
+def _lignes_depuis_instantanes(association_id, debut_periode, fin_periode):
+    """
+    Lignes au format de requete_details_logements, assemblées à partir des
+    instantanés mensuels fusionnés et d'une requête sur les logements (libellés à jour)
+    """
+    fusion = fusionner_instantanes(obtenir_instantanes(association_id, debut_periode, fin_periode))
+
+    logements = Logement.objects.filter(pk__in=fusion).values(
+        'id',
+        'numero',
+        'resident__first_name',
+        'resident__last_name',
+        'resident__username',
+    )
+
+    lignes = []
+    for logement in logements:
+        agregat = fusion[logement['id']]
+        lignes.append({
+            'logement_id': logement['id'],
+            'logement__numero': logement['numero'],
+            'logement__resident__first_name': logement['resident__first_name'],
+            'logement__resident__last_name': logement['resident__last_name'],
+            'logement__resident__username': logement['resident__username'],
+            'montant_du': agregat['montant_du'],
+            'montant_paye': agregat['montant_paye'],
+            'nombre_cotisations': agregat['nombre_cotisations'],
+            'nombre_paiements': agregat['nombre_paiements'],
+            'nombre_retard': agregat['nombre_retard'],
+            'prochaine_echeance': (
+                date.fromisoformat(agregat['prochaine_echeance']) if agregat['prochaine_echeance'] else None
+            ),
+        })
+
+    lignes.sort(key=lambda ligne: ligne['logement__numero'])
+    return lignes
+
+
+def collecter_donnees_rapport(rapport):
+    """
+    Données du rapport en lignes values(), sans instancier de modèles ;
+    les totaux sont la somme des lignes.
+    Période en mois entiers : fusion des instantanés mensuels, seuls les mois
+    modifiés depuis leur calcul sont relus ; sinon une seule requête (requete_details_logements).
+    Calculé une fois puis partagé par tous les formats ; valeurs sérialisables en JSON
+    """
+    debut_periode, fin_periode = bornes_periode_rapport(rapport)
+
+    if debut_periode.day == 1:
+        lignes = _lignes_depuis_instantanes(rapport.association_id, debut_periode, fin_periode)
+    else:
+        lignes = requete_details_logements(rapport)
+
+    total_attendu = Decimal('0')
+    total_collecte = Decimal('0')
+    nombre_paiements = 0
+    cotisations_retard = 0
+    details_logements = []
+
+    for ligne in lignes:
+        total_attendu += ligne['montant_du'] or Decimal('0')
+        total_collecte += ligne['montant_paye'] or Decimal('0')
+        nombre_paiements += ligne['nombre_paiements']
+        cotisations_retard += ligne['nombre_retard']
+        details_logements.append(formater_detail_logement(ligne))
+
+    return {
+        'debut_periode': debut_periode.isoformat(),
+        'fin_periode': fin_periode.isoformat(),
+        **_resume_financier(total_collecte, total_attendu, nombre_paiements, cotisations_retard),
+        'details_logements': details_logements,
+    }
+
+
+def reponse_fichier_protege(fichier, nom_fichier, content_type='application/octet-stream'):
+    """
+    Réponse de téléchargement d'un FieldFile, à appeler après le contrôle d'accès
+    Selon PROTECTED_MEDIA_SERVER, le transfert est délégué au serveur web
+    (X-Accel-Redirect / X-Sendfile, le worker est libéré aussitôt) ;
+    sinon FileResponse lit le fichier par blocs (sendfile si le serveur WSGI le permet)
+    """
+    serveur = getattr(settings, 'PROTECTED_MEDIA_SERVER', '')
+
+    if serveur == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = iri_to_uri(
+            settings.PROTECTED_MEDIA_URL.rstrip('/') + '/' + fichier.name.lstrip('/')
+        )
+    elif serveur == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fichier.path
+    else:
+        return FileResponse(fichier.open('rb'), as_attachment=True, filename=nom_fichier,
+                            content_type=content_type)
+
+    response['Content-Disposition'] = content_disposition_header(True, nom_fichier)
+    return response
+
+
+def lignes_rapport_csv(rapport, options=None):
+    """
+    Lignes CSV d'un rapport, générées à la demande : résumé (une agrégation) puis
+    détail par logement lu depuis un curseur serveur
+    """
+    if options is None:
+        options = {}
+
+    resume = calculer_resume_financier(rapport)
+
+    yield [f"Rapport {rapport.get_type_rapport_display()}"]
+    yield [f"Association: {rapport.association.nom}"]
+    yield [f"Période: {rapport.periode.strftime('%B %Y')}"]
+    yield [f"Généré le: {datetime.now().strftime('%d/%m/%Y à %H:%M')}"]
+    yield []
+
+    yield ['Résumé Financier']
+    yield ['Total collecté', f"{resume['total_collecte']} DA"]
+    yield ['Total attendu', f"{resume['total_attendu']} DA"]
+    yield ['Taux de recouvrement', f"{resume['taux_recouvrement']:.1f}%"]
+    yield ['Nombre de paiements', resume['nombre_paiements']]
+    yield ['Cotisations en retard', resume['cotisations_retard']]
+    yield []
+
+    if options.get('inclure_details', False):
+        yield ['Détails par Logement']
+        yield ['Logement', 'Résident', 'Statut', 'Montant', 'Date Échéance']
+        for ligne in requete_details_logements(rapport).iterator(chunk_size=TAILLE_LOT_EXPORT):
+            detail = formater_detail_logement(ligne)
+            yield [detail['logement'], detail['resident'], detail['statut'], detail['montant'], detail['echeance']]
@@ -1,18 +1,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, Http404, JsonResponse
+from django.http import Http404, JsonResponse
 from django.conf import settings
-from django.db.models import Count, Sum
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+from django.utils import timezone
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
+import logging
 import os
 
 from .models import RapportMensuel
 from .forms import GenerationRapportForm, FiltresRapportsForm
-from .utils import generer_rapport_pdf, generer_rapport_excel, generer_rapport_csv
+from .tasks import generer_rapport_fichier
+from .utils import lignes_rapport_csv, reponse_fichier_protege
+from iltizem.exports import reponse_csv_streaming
 from apps.associations.models import Association
 
+logger = logging.getLogger('iltizem')
+
 
 @login_required
 def liste_rapports(request):
@@ -43,22 +50,37 @@ def liste_rapports(request):
         if form.cleaned_data.get('date_fin'):
             rapports = rapports.filter(periode__lte=form.cleaned_data['date_fin'])
 
-    rapports = rapports.order_by('-date_generation')[:50]  # Limiter pour performance
+    # Compteurs par statut en une requête, avant la limite d'affichage
+    stats = rapports.aggregate(
+        total=Count('id'),
+        generes=Count('id', filter=Q(statut='genere')),
+        en_cours=Count('id', filter=Q(statut='en_cours')),
+        erreurs=Count('id', filter=Q(statut='erreur')),
+    )
+
+    rapports = rapports.select_related('association').order_by('-date_generation')[:50]  # Limiter pour performance
 
     context = {
         'rapports': rapports,
         'form': form,
-        'stats': {
-            'total': rapports.count(),
-            'generes': rapports.filter(statut='genere').count(),
-            'en_cours': rapports.filter(statut='en_cours').count(),
-            'erreurs': rapports.filter(statut='erreur').count(),
-        }
+        'stats': stats,
     }
 
     return render(request, 'rapports/liste.html', context)
 
 
+def _lancer_generation(rapport_id, options):
+    """Mettre la génération en file ; broker indisponible : le rapport passe en erreur, relançable"""
+    try:
+        generer_rapport_fichier.delay(rapport_id, options)
+    except Exception as e:
+        logger.exception(f"Mise en file du rapport {rapport_id} impossible")
+        RapportMensuel.objects.filter(pk=rapport_id, statut='en_cours').update(
+            statut='erreur',
+            message_erreur=f"Génération non lancée : {e}",
+        )
+
+
 @login_required
 def generer_rapport(request):
     """Générer un nouveau rapport"""
@@ -93,51 +115,47 @@ def generer_rapport(request):
                 type_rapport=type_rapport
             ).first()
 
-            if rapport_existant:
+            options = {
+                'inclure_details': form.cleaned_data.get('inclure_details', False),
+                'inclure_graphiques': form.cleaned_data.get('inclure_graphiques', False),
+            }
+
+            if rapport_existant and rapport_existant.statut == 'genere':
                 messages.warning(request, "Ce rapport existe déjà. Téléchargement du rapport existant.")
                 return redirect('rapports:telecharger', rapport_id=rapport_existant.id)
 
-            # Créer le rapport
-            rapport = RapportMensuel.objects.create(
-                association=association,
-                periode=periode,
-                type_rapport=type_rapport,
-                format_fichier=form.cleaned_data['format_fichier'],
-                genere_par=request.user
-            )
-
-            # Générer le fichier selon le format
-            try:
-                options = {
-                    'inclure_details': form.cleaned_data.get('inclure_details', False),
-                    'inclure_graphiques': form.cleaned_data.get('inclure_graphiques', False),
-                }
-
-                if rapport.format_fichier == 'pdf':
-                    fichier_path = generer_rapport_pdf(rapport, options)
-                elif rapport.format_fichier == 'excel':
-                    fichier_path = generer_rapport_excel(rapport, options)
-                elif rapport.format_fichier == 'csv':
-                    fichier_path = generer_rapport_csv(rapport, options)
-
-                # Mettre à jour le rapport
-                rapport.fichier = fichier_path
-                rapport.statut = 'genere'
-
-                # Calculer la taille du fichier
-                if os.path.exists(fichier_path):
-                    rapport.taille_fichier = os.path.getsize(fichier_path)
+            if rapport_existant and rapport_existant.statut == 'en_cours' and not rapport_existant.generation_abandonnee():
+                messages.info(request, "Ce rapport est déjà en cours de génération.")
+                return redirect('rapports:liste')
 
+            if rapport_existant:
+                # Rapport précalculé, en erreur ou abandonné : générer le fichier sur la même ligne,
+                # à partir des données précalculées si aucun mois n'a été modifié depuis
+                rapport = rapport_existant
+                if not rapport.donnees_precalculees_valides():
+                    rapport.donnees_json = None
+                rapport.format_fichier = form.cleaned_data['format_fichier']
+                rapport.genere_par = request.user
+                rapport.statut = 'en_cours'
+                rapport.message_erreur = ''
+                rapport.lignes_traitees = rapport.lignes_total = rapport.progression = 0
+                rapport.date_generation = timezone.now()
                 rapport.save()
+            else:
+                # Créer le rapport
+                rapport = RapportMensuel.objects.create(
+                    association=association,
+                    periode=periode,
+                    type_rapport=type_rapport,
+                    format_fichier=form.cleaned_data['format_fichier'],
+                    genere_par=request.user
+                )
 
-                messages.success(request, f"Rapport {type_rapport} généré avec succès")
-                return redirect('rapports:telecharger', rapport_id=rapport.id)
+            # Générer le fichier en tâche de fond, une fois la ligne visible par le worker
+            transaction.on_commit(lambda: _lancer_generation(rapport.id, options))
 
-            except Exception as e:
-                rapport.statut = 'erreur'
-                rapport.save()
-                messages.error(request, f"Erreur lors de la génération: {str(e)}")
-                return redirect('rapports:liste')
+            messages.success(request, f"Génération du rapport {type_rapport} lancée")
+            return redirect('rapports:liste')
 
     else:
         form = GenerationRapportForm()
@@ -163,25 +181,63 @@ def telecharger_rapport(request, rapport_id):
         except Association.DoesNotExist:
             raise Http404("Rapport non trouvé")
 
+    if rapport.statut != 'genere':
+        messages.info(request, f"Rapport non disponible ({rapport.get_statut_display().lower()})")
+        return redirect('rapports:liste')
+
     # Vérifier que le fichier existe
     if not rapport.fichier or not os.path.exists(rapport.fichier.path):
         messages.error(request, "Fichier de rapport introuvable")
         return redirect('rapports:liste')
 
-    # Préparer la réponse de téléchargement
-    with open(rapport.fichier.path, 'rb') as fichier:
-        response = HttpResponse(
-            fichier.read(),
-            content_type='application/octet-stream'
-        )
+    # Nom du fichier
+    nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.nom}_{rapport.periode.strftime('%Y-%m')}.{rapport.format_fichier}"
+    nom_fichier = nom_fichier.replace(' ', '_').replace('/', '-')
+
+    # Transfert en flux, ou délégué au serveur web (PROTECTED_MEDIA_SERVER)
+    return reponse_fichier_protege(rapport.fichier, nom_fichier)
+
+
+@login_required
+def statut_rapport(request, rapport_id):
+    """État de génération d'un rapport (JSON), interrogé périodiquement par la liste"""
+    rapport = get_object_or_404(RapportMensuel, id=rapport_id)
+
+    # Vérifier les permissions
+    if request.user.role == 'admin_association':
+        if not Association.objects.filter(admin_principal=request.user, id=rapport.association_id).exists():
+            raise Http404("Rapport non trouvé")
+    elif request.user.role != 'super_admin':
+        return JsonResponse({'error': 'Accès non autorisé'}, status=403)
+
+    return JsonResponse(rapport.get_statut_dict())
+
+
+@login_required
+def exporter_rapport_csv(request, rapport_id):
+    """
+    Export CSV en flux d'un rapport, calculé à la volée depuis la base
+    (pas de fichier intermédiaire, mémoire constante) ; ?details=0 pour le résumé seul
+    """
+    rapport = get_object_or_404(RapportMensuel.objects.select_related('association'), id=rapport_id)
+
+    # Vérifier les permissions
+    if request.user.role == 'admin_association':
+        try:
+            association = Association.objects.get(admin_principal=request.user)
+            if rapport.association != association:
+                raise Http404("Rapport non trouvé")
+        except Association.DoesNotExist:
+            raise Http404("Rapport non trouvé")
+    elif request.user.role != 'super_admin':
+        raise Http404("Rapport non trouvé")
 
-        # Nom du fichier
-        nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.nom}_{rapport.periode.strftime('%Y-%m')}.{rapport.format_fichier}"
-        nom_fichier = nom_fichier.replace(' ', '_').replace('/', '-')
+    options = {'inclure_details': request.GET.get('details', '1') != '0'}
 
-        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    nom_fichier = f"rapport_{rapport.type_rapport}_{rapport.association.nom}_{rapport.periode.strftime('%Y-%m')}.csv"
+    nom_fichier = nom_fichier.replace(' ', '_').replace('/', '-')
 
-        return response
+    return reponse_csv_streaming(nom_fichier, lignes_rapport_csv(rapport, options))
 
 
 @login_required
@@ -0,0 +1,29 @@
+"""
+Signaux de l'espace résident
+- Invalidation du tableau de bord en cache quand une cotisation ou un paiement change
+  (les écritures en masse invalident explicitement, voir invalider_tableaux_bord_residents)
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.cotisations.models import Cotisation
+from apps.paiements.models import Paiement
+from .utils import invalider_tableaux_bord_residents
+
+
+@receiver(post_save, sender=Cotisation)
+@receiver(post_delete, sender=Cotisation)
+def invalider_tableau_bord_cotisation(sender, instance, **kwargs):
+    invalider_tableaux_bord_residents([instance.logement_id])
+
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def invalider_tableau_bord_paiement(sender, instance, **kwargs):
+    if Paiement.cotisation.is_cached(instance):
+        logement_id = instance.cotisation.logement_id
+    else:
+        logement_id = Cotisation.objects.filter(pk=instance.cotisation_id).values_list('logement_id', flat=True).first()
+    if logement_id is not None:
+        invalider_tableaux_bord_residents([logement_id])
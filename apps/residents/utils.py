@@ -0,0 +1,159 @@
+"""
+Utilitaires de l'espace résident
+- Données du tableau de bord : une agrégation conditionnelle et trois listes courtes,
+  mises en cache par logement
+- Statistiques des graphiques : série mensuelle et répartition par statut, deux requêtes groupées
+- Invalidation du cache à chaque modification d'une cotisation ou d'un paiement du logement
+"""
+
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from apps.cotisations.models import Cotisation
+from apps.paiements.models import Paiement
+
+# Durée de vie maximale du tableau de bord en cache (secondes), en plus de l'invalidation
+DUREE_CACHE_TABLEAU_BORD = 60 * 15
+
+# Nombre de cotisations et de paiements récents affichés
+NOMBRE_ELEMENTS_RECENTS = 5
+
+# Durée de vie des statistiques des graphiques en cache (secondes), interrogées à chaque affichage
+DUREE_CACHE_STATISTIQUES = 60 * 5
+
+# Nombre de mois de la série des paiements, mois en cours compris
+NOMBRE_MOIS_STATISTIQUES = 12
+
+
+def cle_cache_tableau_bord(logement_id):
+    return f"tableau_bord_resident:{logement_id}"
+
+
+def cle_cache_statistiques(logement_id):
+    return f"statistiques_resident:{logement_id}"
+
+
+def calculer_tableau_bord_resident(logement):
+    """
+    Statistiques, listes récentes et prochaine échéance d'un logement
+    Statistiques en un seul aggregate() (Count / Sum filtrés), listes avec select_related
+    """
+    cotisations = Cotisation.objects.filter(logement=logement)
+    ouvertes = Q(statut__in=['due', 'retard'])
+
+    totaux = cotisations.aggregate(
+        total_cotisations=Count('id'),
+        cotisations_payees=Count('id', filter=Q(statut='payee')),
+        cotisations_dues=Count('id', filter=ouvertes),
+        cotisations_retard=Count('id', filter=Q(statut='retard')),
+        total_paye=Sum('paiement__montant'),
+        total_du=Sum('montant', filter=ouvertes),
+    )
+    total_cotisations = totaux['total_cotisations']
+
+    return {
+        'stats': {
+            'total_cotisations': total_cotisations,
+            'cotisations_payees': totaux['cotisations_payees'],
+            'cotisations_dues': totaux['cotisations_dues'],
+            'cotisations_retard': totaux['cotisations_retard'],
+            'total_paye': totaux['total_paye'] or 0,
+            'total_du': totaux['total_du'] or 0,
+            'taux_paiement': round((totaux['cotisations_payees'] / total_cotisations * 100), 1) if total_cotisations > 0 else 0,
+        },
+        'cotisations_recentes': list(
+            cotisations.select_related('type_cotisation').order_by('-periode')[:NOMBRE_ELEMENTS_RECENTS]
+        ),
+        'paiements_recents': list(
+            Paiement.objects.filter(cotisation__logement=logement).select_related(
+                'cotisation__type_cotisation'
+            ).order_by('-date_enregistrement')[:NOMBRE_ELEMENTS_RECENTS]
+        ),
+        'prochaine_echeance': cotisations.filter(ouvertes).select_related(
+            'type_cotisation'
+        ).order_by('date_echeance').first(),
+    }
+
+
+def donnees_tableau_bord_resident(logement):
+    """Données du tableau de bord depuis le cache, calculées au premier affichage"""
+    cle = cle_cache_tableau_bord(logement.pk)
+    donnees = cache.get(cle)
+    if donnees is None:
+        donnees = calculer_tableau_bord_resident(logement)
+        cache.set(cle, donnees, DUREE_CACHE_TABLEAU_BORD)
+    return donnees
+
+
+def calculer_statistiques_resident(logement, aujourd_hui=None):
+    """
+    Paiements par mois sur NOMBRE_MOIS_STATISTIQUES mois et répartition des cotisations par statut
+    Une requête groupée par mois (TruncMonth), mois sans paiement complétés à zéro,
+    et une requête groupée par statut
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    debut_periode = (aujourd_hui - relativedelta(months=NOMBRE_MOIS_STATISTIQUES - 1)).replace(day=1)
+
+    montants = dict(
+        Paiement.objects.filter(
+            cotisation__logement=logement,
+            date_paiement__range=(debut_periode, aujourd_hui),
+        ).annotate(
+            mois=TruncMonth('date_paiement')
+        ).values('mois').annotate(
+            total=Sum('montant')
+        ).order_by().values_list('mois', 'total')
+    )
+
+    paiements_par_mois = []
+    for decalage in range(NOMBRE_MOIS_STATISTIQUES):
+        mois = debut_periode + relativedelta(months=decalage)
+        paiements_par_mois.append({
+            'mois': mois.strftime('%m/%Y'),
+            'montant': float(montants.get(mois) or 0),
+        })
+
+    comptes = dict(
+        Cotisation.objects.filter(logement=logement).values('statut').annotate(
+            count=Count('id')
+        ).order_by().values_list('statut', 'count')
+    )
+
+    # Ordre et libellés des choix du modèle, statuts absents omis
+    repartition_statuts = [
+        {'statut': label, 'count': comptes[statut]}
+        for statut, label in Cotisation._meta.get_field('statut').choices
+        if comptes.get(statut)
+    ]
+
+    return {
+        'paiements_par_mois': paiements_par_mois,
+        'repartition_statuts': repartition_statuts,
+    }
+
+
+def statistiques_resident(logement):
+    """Statistiques des graphiques depuis le cache (DUREE_CACHE_STATISTIQUES)"""
+    cle = cle_cache_statistiques(logement.pk)
+    statistiques = cache.get(cle)
+    if statistiques is None:
+        statistiques = calculer_statistiques_resident(logement)
+        cache.set(cle, statistiques, DUREE_CACHE_STATISTIQUES)
+    return statistiques
+
+
+def invalider_tableaux_bord_residents(logement_ids):
+    """
+    Retirer du cache le tableau de bord et les statistiques des logements donnés
+    Après le commit : une lecture concurrente ne remet pas en cache des données d'avant la transaction
+    """
+    cles = []
+    for logement_id in set(logement_ids):
+        cles += [cle_cache_tableau_bord(logement_id), cle_cache_statistiques(logement_id)]
+    if cles:
+        transaction.on_commit(lambda: cache.delete_many(cles))
@@ -1,13 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, Http404, JsonResponse
+from django.http import Http404, JsonResponse
 from django.core.mail import send_mail
 from django.conf import settings
 from django.db.models import Sum, Count, Q
 from django.contrib.auth import update_session_auth_hash
-from datetime import date, timedelta
-from dateutil.relativedelta import relativedelta
+from datetime import timedelta
 import os
 
 from .forms import (
@@ -17,6 +16,8 @@ from .forms import (
 from apps.associations.models import Logement
 from apps.cotisations.models import Cotisation
 from apps.paiements.models import Paiement
+from apps.paiements.recus import PAIEMENTS_RECU_RELATIONS, reponse_recu
+from .utils import donnees_tableau_bord_resident, statistiques_resident
 
 
 @login_required
@@ -27,50 +28,18 @@ def tableau_bord_resident(request):
         return redirect('accounts:login')
 
     try:
-        logement = Logement.objects.get(resident=request.user)
+        logement = Logement.objects.select_related('association').get(resident=request.user)
     except Logement.DoesNotExist:
         messages.warning(request, "Aucun logement assigné. Contactez votre administrateur.")
         return render(request, 'residents/no_logement.html')
 
-    # Statistiques générales
-    cotisations = logement.cotisations.all()
-    paiements = Paiement.objects.filter(cotisation__logement=logement)
-
-    # Statistiques financières
-    total_cotisations = cotisations.count()
-    cotisations_payees = cotisations.filter(statut='payee').count()
-    cotisations_dues = cotisations.filter(statut__in=['due', 'retard']).count()
-    cotisations_retard = cotisations.filter(statut='retard').count()
-
-    total_paye = paiements.aggregate(total=Sum('montant'))['total'] or 0
-    total_du = cotisations.filter(statut__in=['due', 'retard']).aggregate(total=Sum('montant'))['total'] or 0
-
-    # Cotisations récentes
-    cotisations_recentes = cotisations.order_by('-periode')[:5]
-
-    # Paiements récents
-    paiements_recents = paiements.order_by('-date_enregistrement')[:5]
-
-    # Prochaine échéance
-    prochaine_echeance = cotisations.filter(
-        statut__in=['due', 'retard']
-    ).order_by('date_echeance').first()
+    # Statistiques et listes récentes, en cache par logement
+    donnees = donnees_tableau_bord_resident(logement)
 
     context = {
         'logement': logement,
         'association': logement.association,
-        'stats': {
-            'total_cotisations': total_cotisations,
-            'cotisations_payees': cotisations_payees,
-            'cotisations_dues': cotisations_dues,
-            'cotisations_retard': cotisations_retard,
-            'total_paye': total_paye,
-            'total_du': total_du,
-            'taux_paiement': round((cotisations_payees / total_cotisations * 100), 1) if total_cotisations > 0 else 0,
-        },
-        'cotisations_recentes': cotisations_recentes,
-        'paiements_recents': paiements_recents,
-        'prochaine_echeance': prochaine_echeance,
+        **donnees,
     }
 
     return render(request, 'residents/tableau_bord.html', context)
@@ -218,69 +187,13 @@ def telecharger_reçu(request, paiement_id):
         raise Http404("Reçu non trouvé")
 
     paiement = get_object_or_404(
-        Paiement.objects.select_related('cotisation__logement'),
+        Paiement.objects.select_related(*PAIEMENTS_RECU_RELATIONS),
         id=paiement_id,
         cotisation__logement__resident=request.user,
         recu_genere=True
     )
 
-    # Générer le reçu à la demande (simple)
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from io import BytesIO
-
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # En-tête
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(50, height - 80, "REÇU DE PAIEMENT")
-
-    # Informations association
-    association = paiement.cotisation.logement.association
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 120, f"Association: {association.nom}")
-    p.drawString(50, height - 140, f"Adresse: {association.adresse}")
-
-    # Informations résident
-    resident = paiement.cotisation.logement.resident
-    p.drawString(50, height - 180, f"Résident: {resident.get_full_name()}")
-    p.drawString(50, height - 200, f"Logement: {paiement.cotisation.logement.numero}")
-
-    # Informations paiement
-    y = height - 250
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, y, "DÉTAILS DU PAIEMENT")
-
-    y -= 30
-    p.setFont("Helvetica", 11)
-    infos = [
-        f"Période: {paiement.cotisation.periode.strftime('%B %Y')}",
-        f"Montant: {paiement.montant} DA",
-        f"Méthode: {paiement.get_methode_display()}",
-        f"Date de paiement: {paiement.date_paiement.strftime('%d/%m/%Y')}",
-        f"Référence: {paiement.reference or 'N/A'}",
-        f"Reçu N°: RECU-{paiement.id}",
-    ]
-
-    for info in infos:
-        p.drawString(50, y, info)
-        y -= 20
-
-    # Signature
-    y -= 40
-    p.drawString(50, y, f"Reçu généré le {date.today().strftime('%d/%m/%Y')}")
-    p.drawString(50, y - 20, "Signature électronique - Plateforme iltizem")
-
-    p.showPage()
-    p.save()
-
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="recu_paiement_{paiement.id}.pdf"'
-
-    return response
+    return reponse_recu(request, paiement, f"recu_paiement_{paiement.id}.pdf")
 
 
 @login_required
@@ -413,48 +326,15 @@ def statistiques_resident_api(request):
         return JsonResponse({'error': 'Accès non autorisé'}, status=403)
 
     try:
-        logement = Logement.objects.get(resident=request.user)
+        logement = Logement.objects.select_related('association').get(resident=request.user)
     except Logement.DoesNotExist:
         return JsonResponse({'error': 'Aucun logement assigné'}, status=404)
 
-    # Paiements par mois sur les 12 derniers mois
-    aujourd_hui = date.today()
-    debut_periode = aujourd_hui - relativedelta(months=11)
-    debut_periode = debut_periode.replace(day=1)
-
-    paiements_par_mois = []
-    current_date = debut_periode
-
-    while current_date <= aujourd_hui:
-        fin_mois = (current_date + relativedelta(months=1)) - relativedelta(days=1)
-
-        montant_mois = Paiement.objects.filter(
-            cotisation__logement=logement,
-            date_paiement__gte=current_date,
-            date_paiement__lte=fin_mois
-        ).aggregate(total=Sum('montant'))['total'] or 0
-
-        paiements_par_mois.append({
-            'mois': current_date.strftime('%m/%Y'),
-            'montant': float(montant_mois)
-        })
-
-        current_date += relativedelta(months=1)
-
-    # Répartition par statut
-    cotisations = logement.cotisations.all()
-    repartition_statuts = []
-    for statut, label in Cotisation._meta.get_field('statut').choices:
-        count = cotisations.filter(statut=statut).count()
-        if count > 0:
-            repartition_statuts.append({
-                'statut': label,
-                'count': count
-            })
+    # Série mensuelle et répartition par statut : deux requêtes groupées, en cache
+    statistiques = statistiques_resident(logement)
 
     data = {
-        'paiements_par_mois': paiements_par_mois,
-        'repartition_statuts': repartition_statuts,
+        **statistiques,
         'logement_info': {
             'numero': logement.numero,
             'association': logement.association.nom,
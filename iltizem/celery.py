@@ -33,24 +33,52 @@ def debug_task(self):
 app.conf.beat_schedule = {
     # Envoi des rappels de retard tous les jours à 9h
     'envoyer-rappels-quotidiens': {
-        'task': 'notifications.tasks.envoyer_rappels_automatiques',
+        'task': 'apps.notifications.tasks.envoyer_rappels_automatiques',
         'schedule': 60.0 * 60 * 24,  # 24 heures en secondes (plus simple que crontab pour commencer)
         'options': {'expires': 30.0}
     },
 
     # Génération des cotisations mensuelles le 25 de chaque mois
     'generer-cotisations-mensuelles': {
-        'task': 'cotisations.tasks.generer_cotisations_automatiques',
+        'task': 'apps.cotisations.tasks.generer_cotisations_automatiques',
         'schedule': 60.0 * 60 * 24 * 30,  # 30 jours (sera affiné avec crontab plus tard)
         'options': {'expires': 60.0}
     },
 
     # Mise à jour des statuts de cotisations (retard) tous les jours à 1h
     'mettre-a-jour-statuts': {
-        'task': 'cotisations.tasks.mettre_a_jour_statuts_retard',
+        'task': 'apps.cotisations.tasks.mettre_a_jour_statuts_retard',
         'schedule': 60.0 * 60 * 24,  # 24 heures
         'options': {'expires': 30.0}
     },
+
+    # Reconstruction des résumés financiers (filet de sécurité des signaux)
+    'reconstruire-resumes-financiers': {
+        'task': 'apps.cotisations.tasks.reconstruire_resumes_financiers',
+        'schedule': 60.0 * 60 * 24,  # 24 heures
+        'options': {'expires': 60.0 * 60}
+    },
+
+    # Livraison des notifications en attente (outbox) chaque minute
+    'livrer-notifications-en-attente': {
+        'task': 'apps.notifications.tasks.livrer_notifications_en_attente',
+        'schedule': 60.0,
+        'options': {'expires': 50.0}
+    },
+
+    # Relance des notifications en erreur toutes les 5 minutes
+    'relancer-notifications-en-erreur': {
+        'task': 'apps.notifications.tasks.relancer_notifications_en_erreur',
+        'schedule': 60.0 * 5,
+        'options': {'expires': 240.0}
+    },
+
+    # Précalcul nocturne des rapports mensuels du mois écoulé
+    'precalculer-rapports-mensuels': {
+        'task': 'apps.rapports.tasks.precalculer_rapports_mensuels',
+        'schedule': 60.0 * 60 * 24,  # 24 heures
+        'options': {'expires': 60.0 * 60}
+    },
 }
 
 # Fuseau horaire
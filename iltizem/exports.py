@@ -0,0 +1,35 @@
+"""
+Exports CSV en flux, communs à toutes les applications
+"""
+
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+# Nombre de lignes lues par aller-retour avec la base pendant un export en flux
+TAILLE_LOT_EXPORT = 2000
+
+
+class _TamponEcho:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne écrite au lieu de la stocker"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def reponse_csv_streaming(nom_fichier, lignes):
+    """
+    Réponse CSV produite au fil de l'eau : chaque ligne est encodée puis envoyée,
+    rien n'est accumulé en mémoire (lignes: itérable, idéalement un curseur iterator())
+    """
+    writer = csv.writer(_TamponEcho())
+
+    def contenu():
+        yield '\ufeff'  # BOM : accents corrects à l'ouverture dans Excel
+        for ligne in lignes:
+            yield writer.writerow(ligne)
+
+    response = StreamingHttpResponse(contenu(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(True, nom_fichier)
+    return response
@@ -177,6 +177,13 @@ STATICFILES_FINDERS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Téléchargements protégés (rapports) délégués au serveur web après le contrôle d'accès
+# '' : Django sert le fichier (FileResponse)
+# 'x-accel-redirect' : nginx, location interne PROTECTED_MEDIA_URL -> MEDIA_ROOT
+# 'x-sendfile' : Apache mod_xsendfile / lighttpd (chemin absolu du fichier)
+PROTECTED_MEDIA_SERVER = config('PROTECTED_MEDIA_SERVER', default='')
+PROTECTED_MEDIA_URL = config('PROTECTED_MEDIA_URL', default='/protected-media/')
+
 # ==============================================================================
 # DJANGO REST FRAMEWORK
 # ==============================================================================
@@ -240,6 +247,26 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.cotisations.tasks.mettre_a_jour_statuts_retard',
         'schedule': crontab(hour=1, minute=0),
     },
+    # Livraison des notifications en attente (outbox) chaque minute
+    'livraison-notifications': {
+        'task': 'apps.notifications.tasks.livrer_notifications_en_attente',
+        'schedule': crontab(minute='*'),
+    },
+    # Relance des notifications en erreur toutes les 5 minutes
+    'relance-notifications-erreur': {
+        'task': 'apps.notifications.tasks.relancer_notifications_en_erreur',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Reconstruction des résumés financiers à 1h30, après les statuts de retard
+    'reconstruction-resumes-financiers': {
+        'task': 'apps.cotisations.tasks.reconstruire_resumes_financiers',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    # Précalcul des rapports mensuels du mois écoulé à 2h30
+    'precalcul-rapports-mensuels': {
+        'task': 'apps.rapports.tasks.precalculer_rapports_mensuels',
+        'schedule': crontab(hour=2, minute=30),
+    },
 }
 
 # ==============================================================================
@@ -16,6 +16,7 @@ urlpatterns = [
     path('cotisations/', include('apps.cotisations.urls')),
     path('paiements/', include('apps.paiements.urls')),
     path('rapports/', include('apps.rapports.urls')),  # ✅ AJOUTÉ
+    path('notifications/', include('apps.notifications.urls')),
 
     # API REST
     path('api/', include('apps.api.urls')),
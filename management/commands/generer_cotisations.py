@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
 from datetime import date, timedelta
 from apps.associations.models import Association
-from apps.cotisations.models import TypeCotisation, Cotisation
+from apps.cotisations.models import TypeCotisation
+from apps.cotisations.utils import generer_cotisations_en_masse
 
 
 class Command(BaseCommand):
@@ -11,8 +13,9 @@ class Command(BaseCommand):
         """Génération automatique - Principe KISS"""
         aujourd_hui = date.today()
 
-        for association in Association.objects.filter(actif=True):
-            for type_cotisation in association.types_cotisations.filter(actif=True):
+        def calculer_cibles(association):
+            cibles = []
+            for type_cotisation in association.types_actifs:
 
                 # Calculer la prochaine période selon la périodicité
                 if type_cotisation.periodicite == 'mensuelle':
@@ -26,19 +29,24 @@ class Command(BaseCommand):
                     prochaine_periode = aujourd_hui.replace(day=1, month=1)
                     echeance = prochaine_periode + timedelta(days=366)
 
-                # Créer cotisations pour tous les logements
-                for logement in association.logements.all():
-                    cotisation, created = Cotisation.objects.get_or_create(
-                        logement=logement,
-                        type_cotisation=type_cotisation,
-                        periode=prochaine_periode,
-                        defaults={
-                            'montant': type_cotisation.montant,
-                            'date_echeance': echeance,
-                        }
-                    )
-
-                    if created:
-                        self.stdout.write(f"Cotisation créée: {cotisation}")
-
-        self.stdout.write(self.style.SUCCESS("Génération des cotisations terminée"))
\ No newline at end of file
+                cibles.append((type_cotisation, prochaine_periode, echeance))
+            return cibles
+
+        associations = Association.objects.filter(actif=True).prefetch_related(
+            Prefetch(
+                'types_cotisations',
+                queryset=TypeCotisation.objects.filter(actif=True),
+                to_attr='types_actifs'
+            )
+        )
+
+        # Créer en masse les cotisations manquantes, association par association
+        resultats = generer_cotisations_en_masse(associations, calculer_cibles)
+
+        for association_id, created_count in resultats.items():
+            if created_count:
+                self.stdout.write(f"Association {association_id}: {created_count} cotisation(s) créée(s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Génération des cotisations terminée ({sum(resultats.values())} créées)"
+        ))